@@ -0,0 +1,70 @@
+import sys
+import time
+import numpy as np
+import pandas as pd
+import plotly.graph_objects as go
+from figures import build_figure
+
+# Times the work update_graph does after the fetch: building the figure and
+# serialising it to JSON, as Dash does before sending it to the browser.
+# python benchmark_figures.py [--legacy] also times the old row-by-row version.
+
+SIZES = (10_000, 100_000)
+INTERVAL = '5s'
+
+def make_frame(size, seed=0):
+    # 5s buckets with a gap of a few minutes every ~500 points, like trips with stops
+    rng = np.random.default_rng(seed)
+    steps = np.where(rng.random(size) < 0.002, 600, 5)
+    timestamps = np.datetime64('2024-01-01T00:00:00') + np.cumsum(steps).astype('timedelta64[s]')
+    return pd.DataFrame({'timestamp': timestamps, 'data': np.abs(np.cumsum(rng.normal(size=size)))})
+
+def legacy_figure(df, interval):
+    # update_graph before the figure code moved to figures.py
+    threshold = 5
+    df = df.copy()
+    df['time_diff'] = df['timestamp'].diff().dt.total_seconds().fillna(0)
+    segments = []
+    segment = []
+    for i in range(len(df)):
+        if df.iloc[i]['time_diff'] <= threshold:
+            segment.append((df.iloc[i]['timestamp'], df.iloc[i]['data']))
+        else:
+            if segment:
+                segments.append(segment)
+                segment = []
+            segment.append((df.iloc[i]['timestamp'], df.iloc[i]['data']))
+    if segment:
+        segments.append(segment)
+    fig = go.Figure()
+    for segment in segments:
+        segment_df = pd.DataFrame(segment, columns=['timestamp', 'data'])
+        fig.add_trace(go.Scatter(
+            x=segment_df['timestamp'], y=segment_df['data'], mode='lines+markers',
+            line=dict(color='blue'), marker=dict(color='blue', size=6), name=f'{interval} Data'
+        ))
+    return fig
+
+def timed(build, df):
+    started = time.perf_counter()
+    fig = build(df)
+    built = time.perf_counter()
+    payload = fig.to_json()
+    finished = time.perf_counter()
+    return built - started, finished - built, len(payload), len(fig.data)
+
+if __name__ == '__main__':
+    builders = [('vectorised', lambda df: build_figure(df, INTERVAL, 'benchmark'))]
+    if '--legacy' in sys.argv:
+        builders.append(('legacy', lambda df: legacy_figure(df, INTERVAL)))
+
+    # Plotly builds its validators on first use, keep that out of the numbers
+    for _, build in builders:
+        build(make_frame(100))
+
+    for size in SIZES:
+        df = make_frame(size)
+        for name, build in builders:
+            build_seconds, json_seconds, payload, traces = timed(build, df)
+            print(f"{name:>10} {size:>7} points: build {build_seconds * 1000:8.1f} ms, "
+                  f"to_json {json_seconds * 1000:8.1f} ms, {payload / 1e6:6.2f} MB, {traces} traces")
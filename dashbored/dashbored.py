@@ -1,18 +1,32 @@
-from dash import Dash, html, dcc, Input, Output, State
+from dash import Dash, html, dcc, Input, Output, State, ctx, no_update
+import numpy as np
 import pandas as pd
-import plotly.graph_objects as go
 from get_data import get_data
+from get_data import get_bounds
+from get_data import get_latest
+from figures import build_figure
+from figures import filter_window
+from figures import window_bounds
+from figures import insert_gaps
 
 app = Dash()
 
-# Fetch the data initially to determine the range of dates and hours
-df = get_data(1, '2min', 'speed')  # Using '2min' as an example; adjust as needed
+# Live mode polls for new samples this often (ms) and keeps at most this many points on the chart
+LIVE_UPDATE_MS = 1000
+LIVE_MAX_POINTS = 600
 
-if df is not None and not df.empty:
-    first_date = df['timestamp'].min().date()
-    last_date = df['timestamp'].max().date()
-    min_hour = df['timestamp'].min().hour
-    max_hour = df['timestamp'].max().hour
+# Stored samples are a pipeline window (5s) apart, the live line breaks after a longer silence
+LIVE_GAP_SECONDS = 15
+
+# Fetch only the first and last sample time to determine the range of dates and hours
+bounds = get_bounds(1, 'speed')
+
+if bounds is not None:
+    first, last = bounds
+    first_date = first.date()
+    last_date = last.date()
+    min_hour = first.hour
+    max_hour = last.hour
 else:
     first_date = pd.to_datetime('2024-01-01').date()
     last_date = pd.to_datetime('2024-01-01').date()
@@ -59,9 +73,68 @@ app.layout = html.Div([
         clearable=False
     ),
     
-    dcc.Graph(id='graph')
+    # History shows the selected window, Live follows the newest samples
+    dcc.RadioItems(
+        id='mode',
+        options=[
+            {'label': 'History', 'value': 'history'},
+            {'label': 'Live', 'value': 'live'},
+        ],
+        value='history',
+        inline=True
+    ),
+
+    dcc.Graph(id='graph'),
+
+    # Live chart, extended in place with extendData instead of being redrawn
+    dcc.Graph(id='live-graph', style={'display': 'none'}),
+    dcc.Interval(id='live-interval', interval=LIVE_UPDATE_MS, disabled=True),
+    dcc.Store(id='live-cursor')
 ])
 
+@app.callback(
+    [Output('graph', 'style'),
+     Output('live-graph', 'style'),
+     Output('live-interval', 'disabled')],
+    Input('mode', 'value')
+)
+def toggle_mode(mode):
+    live = mode == 'live'
+    return {'display': 'none' if live else 'block'}, {'display': 'block' if live else 'none'}, not live
+
+@app.callback(
+    [Output('live-graph', 'figure'),
+     Output('live-graph', 'extendData'),
+     Output('live-cursor', 'data')],
+    [Input('mode', 'value'),
+     Input('live-interval', 'n_intervals')],
+    State('live-cursor', 'data')
+)
+def update_live(mode, n_intervals, cursor):
+    if mode != 'live':
+        return no_update, no_update, None
+
+    if ctx.triggered_id == 'mode' or cursor is None:
+        # Entering live mode: draw the newest points once, then only extend
+        latest = get_latest(1, 'speed', limit=LIVE_MAX_POINTS)
+        df, cursor = latest if latest is not None else (None, None)
+        fig = build_figure(df, 'Live', 'Live Speed Data', gap_seconds=LIVE_GAP_SECONDS)
+        fig.update_layout(uirevision='live')
+        return fig, no_update, cursor
+
+    latest = get_latest(1, 'speed', after=cursor)
+    if latest is None or latest[0].empty:
+        return no_update, no_update, no_update
+    df, new_cursor = latest
+
+    # The last plotted point leads so a gap to the first new one is detected too
+    x, y = insert_gaps(
+        np.concatenate(([np.datetime64(cursor, 'ms')], df['timestamp'].to_numpy())),
+        np.concatenate(([np.nan], df['data'].to_numpy())),
+        LIVE_GAP_SECONDS
+    )
+    return no_update, (dict(x=[x[1:]], y=[y[1:]]), [0], LIVE_MAX_POINTS), new_cursor
+
 @app.callback(
     Output('graph', 'figure'),
     [Input('date-picker', 'date'),
@@ -69,68 +142,18 @@ app.layout = html.Div([
      Input('interval-dropdown', 'value')]
 )
 def update_graph(selected_date, hour_range, interval):
-    # Fetch the data
-    df = get_data(1, interval, 'speed')
+    # Fetch only the selected date and hour range. get_data keeps recent windows
+    # (FRAME_CACHE_SIZE) and refreshes a revisited one from its last bucket on.
+    selected_date = pd.to_datetime(selected_date)
+    start, end = window_bounds(selected_date, hour_range)
+    df = get_data(1, interval, 'speed', start.to_pydatetime(), end.to_pydatetime())
 
     if df is not None and not df.empty:
-        # Filter by the selected date
-        selected_date = pd.to_datetime(selected_date)
-        df = df[df['timestamp'].dt.date == selected_date.date()]
-
-        # Filter by the selected hour range
-        df = df[(df['timestamp'].dt.hour >= hour_range[0]) & (df['timestamp'].dt.hour <= hour_range[1])]
-
-        # Determine the threshold based on the interval
-        interval_map = {
-            '5s': 5,
-            '30s': 30,
-            '2min': 120,
-            '30min': 1800,
-            '2hours': 7200
-        }
-        threshold = interval_map[interval]  # in seconds
-
-        # Calculate time differences between consecutive points
-        df['time_diff'] = df['timestamp'].diff().dt.total_seconds().fillna(0)
-
-        # Split the data into segments based on the threshold
-        segments = []
-        segment = []
-        for i in range(len(df)):
-            if df.iloc[i]['time_diff'] <= threshold:
-                segment.append((df.iloc[i]['timestamp'], df.iloc[i]['data']))
-            else:
-                if segment:
-                    segments.append(segment)
-                    segment = []
-                segment.append((df.iloc[i]['timestamp'], df.iloc[i]['data']))
-        if segment:
-            segments.append(segment)
-
-        # Create the figure
-        fig = go.Figure()
-
-        # Plot each segment as a separate line
-        for segment in segments:
-            segment_df = pd.DataFrame(segment, columns=['timestamp', 'data'])
-            fig.add_trace(go.Scatter(
-                x=segment_df['timestamp'],
-                y=segment_df['data'],
-                mode='lines+markers',
-                line=dict(color='blue'),
-                marker=dict(color='blue', size=6),
-                name=f'{interval} Data'
-            ))
-
-        fig.update_layout(
-            title=f'Speed Data for {interval} Interval on {selected_date.strftime("%Y-%m-%d")} between {hour_range[0]}:00 and {hour_range[1]}:00',
-            xaxis_title='Time',
-            yaxis_title='Speed',
-            xaxis=dict(tickformat="%H:%M:%S")
-        )
-    else:
-        fig = go.Figure()
-        fig.update_layout(title='No data available')
+        # Rollup buckets may begin before the window
+        df = filter_window(df, selected_date, hour_range)
+
+    title = f'Speed Data for {interval} Interval on {selected_date.strftime("%Y-%m-%d")} between {hour_range[0]}:00 and {hour_range[1]}:00'
+    fig = build_figure(df, interval, title)
 
     return fig
 
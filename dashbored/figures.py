@@ -0,0 +1,68 @@
+import numpy as np
+import pandas as pd
+import plotly.graph_objects as go
+
+# Dashboard interval -> bucket width in seconds, consecutive points further
+# apart than this are not joined by a line
+INTERVAL_SECONDS = {
+    '5s': 5,
+    '30s': 30,
+    '2min': 120,
+    '30min': 1800,
+    '2hours': 7200
+}
+
+def insert_gaps(timestamps, values, threshold):
+    # Puts a NaN point after every jump of more than threshold seconds, so a
+    # single trace breaks its line there. Vectorised, no per-row Python work.
+    timestamps = np.asarray(timestamps, dtype='datetime64[ns]')
+    values = np.asarray(values, dtype=np.float64)
+    if len(timestamps) < 2:
+        return timestamps, values
+
+    gaps = np.flatnonzero(np.diff(timestamps) > np.timedelta64(threshold, 's'))
+    if not len(gaps):
+        return timestamps, values
+    positions = gaps + 1
+    return (np.insert(timestamps, positions, timestamps[gaps] + np.timedelta64(threshold, 's')),
+            np.insert(values, positions, np.nan))
+
+def build_figure(df, interval, title, yaxis_title='Speed', gap_seconds=None):
+    # df has 'timestamp' and 'data' columns, already limited to what is shown.
+    # Lines break where points are more than gap_seconds (default: the interval) apart.
+    if df is None or df.empty:
+        fig = go.Figure()
+        fig.update_layout(title='No data available')
+        return fig
+
+    gap_seconds = INTERVAL_SECONDS[interval] if gap_seconds is None else gap_seconds
+    x, y = insert_gaps(df['timestamp'].to_numpy(), df['data'].to_numpy(), gap_seconds)
+
+    # One WebGL trace for the whole series, the NaNs split it into segments
+    fig = go.Figure(go.Scattergl(
+        x=x,
+        y=y,
+        mode='lines+markers',
+        connectgaps=False,
+        line=dict(color='blue'),
+        marker=dict(color='blue', size=6),
+        name=f'{interval} Data'
+    ))
+    fig.update_layout(
+        title=title,
+        xaxis_title='Time',
+        yaxis_title=yaxis_title,
+        xaxis=dict(tickformat="%H:%M:%S")
+    )
+    return fig
+
+def window_bounds(selected_date, hour_range):
+    # [start, end) covering selected_date from the start of hour_range[0] to the end of hour_range[1]
+    day = pd.to_datetime(selected_date).normalize()
+    return day + pd.Timedelta(hours=hour_range[0]), day + pd.Timedelta(hours=hour_range[1] + 1)
+
+def filter_window(df, selected_date, hour_range):
+    # Rows of df inside window_bounds(selected_date, hour_range)
+    start, end = window_bounds(selected_date, hour_range)
+    timestamps = df['timestamp']
+    return df[(timestamps >= start) & (timestamps < end)]
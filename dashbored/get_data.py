@@ -3,27 +3,100 @@ import requests
 import numpy as np
 import pandas as pd
 import sys
+from collections import OrderedDict
 
-def get_data(user_id, interval, data_type):
+# Frames kept for incremental fetches, least recently used dropped first
+FRAME_CACHE_SIZE = 32
+
+# Flask data access service (data_access_service/routes.py)
+SERVICE_URL = "http://127.0.0.1:5000"
+
+# Metric names the service serves
+ALLOWED_DATA = ['speed', 'fuel_level', 'fuel_consumption', 'maf', 'oxygen', 'throttle', 'coolant', 'intake_manifold', 'rpm']
+
+# (user, interval, metrics, start, end) -> (DataFrame, cursor and write cursor of the last response)
+_frames = OrderedDict()
+
+def cached_frame(key):
+    cached = _frames.get(key)
+    if cached is not None:
+        _frames.move_to_end(key)
+    return cached
+
+def since_params(params, cached):
+    # Asks only for what changed since the cached frame's response
+    if cached is not None and cached[1] is not None:
+        params['since'] = cached[1]
+        if cached[2] is not None:
+            params['written'] = cached[2]
+
+def merge_frame(key, cached, frame, res_data):
+    # A response to ?since= starts at its 'since', the old cursor bucket or an
+    # earlier one when older rows were written in the meantime, so the cached
+    # rows from there on are replaced by the new ones. Without 'since' the
+    # response is the whole range and replaces the cached frame.
+    cursor = res_data.get('cursor')
+    since = res_data.get('since')
+    if cached is not None and since is not None:
+        cached_df, cached_cursor, _ = cached
+        boundary = pd.to_datetime(since, unit='ms')
+        frame = pd.concat([cached_df[cached_df['timestamp'] < boundary], frame], ignore_index=True)
+        if cursor is None:
+            cursor = cached_cursor
+    _frames[key] = (frame, cursor, res_data.get('written'))
+    _frames.move_to_end(key)
+    while len(_frames) > FRAME_CACHE_SIZE:
+        _frames.popitem(last=False)
+    return frame
+
+def decode_timestamps(res_data):
+    # Columnar responses carry raw little-endian int64 epoch milliseconds, list responses epoch nanoseconds
+    if 'dtype' in res_data:
+        return pd.to_datetime(np.frombuffer(res_data.get('timestamp'), dtype='<i8'), unit='ms')
+    return pd.to_datetime(np.array(res_data.get('timestamp'), dtype=np.int64))
+
+def decode_values(res_data, values):
+    # Columnar values are decoded in place with np.frombuffer, no per-element conversion
+    if 'dtype' in res_data:
+        return np.frombuffer(values, dtype=res_data['dtype'])
+    return np.array(values, dtype=np.float64)
+
+def get_data(user_id, interval, data_type, start=None, end=None, max_points=None, columnar=True, incremental=True):
     """
     General function to fetch speed data for a given user and interval.
     Args:
         user_id (int): The ID of the user.
         interval (str): The time interval (e.g., '5s', '30s', '2min', '30min', '2hours').
+        start (datetime, optional): Only fetch data from this time on.
+        end (datetime, optional): Only fetch data before this time.
+        max_points (int, optional): Have the server reduce each series to about this many points.
+        columnar (bool, optional): Use the binary columnar wire format (default True).
+        incremental (bool, optional): Keep the frame and on the next call only fetch
+            buckets from the last one on (default True, ignored with max_points).
 
     Returns:
         pd.DataFrame: A DataFrame with the timestamps and speed data.
     """
 
-    allowed_data = ['speed', 'fuel_level', 'fuel_consumption', 'maf', 'oxygen', 'throttle', 'coolant', 'intake_manifold', 'rpm']
-    if data_type not in allowed_data:
+    if data_type not in ALLOWED_DATA:
         print(f"data type of {data_type} is not supported", file=sys.stderr)
         return None
 
     try:
-        start_of_url = "http://127.0.0.1:5000"
         # Construct the URL with the provided user ID and interval
-        res = requests.get(f"{start_of_url}/{data_type}/{user_id}/{interval}")
+        params = {}
+        if start is not None:
+            params['start'] = start.isoformat()
+        if end is not None:
+            params['end'] = end.isoformat()
+        if columnar:
+            params['format'] = 'columnar'
+        if max_points is not None:
+            params['max_points'] = max_points
+        key = (user_id, interval, (data_type,), start, end)
+        cached = cached_frame(key) if incremental and max_points is None else None
+        since_params(params, cached)
+        res = requests.get(f"{SERVICE_URL}/{data_type}/{user_id}/{interval}", params=params)
         
         if res.status_code != 200:
             print(f"Request failed with status code: {res.status_code} - {res.text}", file=sys.stderr)
@@ -34,18 +107,191 @@ def get_data(user_id, interval, data_type):
         
         
         # Convert timestamps and speed data to NumPy arrays
-        time_stamps = np.array(res_data.get('timestamp'))
-        data = np.array(res_data.get('data'))
+        time_stamps = decode_timestamps(res_data)
+        data = decode_values(res_data, res_data.get('data'))
 
-        print(time_stamps)
-        print(data)
+        frame = pd.DataFrame({
+            'timestamp': time_stamps,
+            'data': data
+        })
+        if incremental and max_points is None:
+            frame = merge_frame(key, cached, frame, res_data)
+        return frame
 
+    except requests.exceptions.RequestException as e:
+        print(f"Error occurred: {e}", file=sys.stderr)
+        return None
 
+def get_metrics(user_id, interval, data_types, start=None, end=None, max_points=None, columnar=True, incremental=True):
+    """
+    Fetch several metrics for a given user and interval in one request.
+    Args:
+        user_id (int): The ID of the user.
+        interval (str): The time interval (e.g., '5s', '30s', '2min', '30min', '2hours').
+        data_types (list): Metric names, as accepted by get_data.
+        start (datetime, optional): Only fetch data from this time on.
+        end (datetime, optional): Only fetch data before this time.
+        max_points (int, optional): Have the server reduce each series to about this many points.
+        columnar (bool, optional): Use the binary columnar wire format (default True).
+        incremental (bool, optional): Keep the frame and on the next call only fetch
+            buckets from the last one on (default True, ignored with max_points).
 
-        return pd.DataFrame({
-            'timestamp': pd.to_datetime(time_stamps),
-            'data': data
+    Returns:
+        pd.DataFrame: A DataFrame with a timestamp column and one column per metric (NaN where missing).
+    """
+
+    unsupported = [data_type for data_type in data_types if data_type not in ALLOWED_DATA]
+    if not data_types or unsupported:
+        print(f"data types {unsupported} are not supported", file=sys.stderr)
+        return None
+
+    try:
+        params = {'metrics': ','.join(data_types)}
+        if start is not None:
+            params['start'] = start.isoformat()
+        if end is not None:
+            params['end'] = end.isoformat()
+        if columnar:
+            params['format'] = 'columnar'
+        if max_points is not None:
+            params['max_points'] = max_points
+        key = (user_id, interval, tuple(data_types), start, end)
+        cached = cached_frame(key) if incremental and max_points is None else None
+        since_params(params, cached)
+        res = requests.get(f"{SERVICE_URL}/metrics/{user_id}/{interval}", params=params)
+
+        if res.status_code != 200:
+            print(f"Request failed with status code: {res.status_code} - {res.text}", file=sys.stderr)
+            return None
+
+        res_data = msgpack.unpackb(res.content)
+
+        frame = {'timestamp': decode_timestamps(res_data)}
+        for data_type, values in res_data.get('data').items():
+            frame[data_type] = decode_values(res_data, values)
+        frame = pd.DataFrame(frame)
+        if incremental and max_points is None:
+            frame = merge_frame(key, cached, frame, res_data)
+        return frame
+
+    except requests.exceptions.RequestException as e:
+        print(f"Error occurred: {e}", file=sys.stderr)
+        return None
+
+def stream_data(user_id, interval, data_type, start=None, end=None, columnar=True):
+    """
+    Stream a metric for a given user chunk by chunk, for long ranges and raw exports.
+    Args:
+        user_id (int): The ID of the user.
+        interval (str): The time interval, or 'raw' for the stored samples.
+        data_type (str): Metric name, as accepted by get_data.
+        start (datetime, optional): Only fetch data from this time on.
+        end (datetime, optional): Only fetch data before this time.
+        columnar (bool, optional): Use the binary columnar wire format (default True).
+
+    Yields:
+        pd.DataFrame: One DataFrame with timestamps and data per chunk.
+    """
+
+    if data_type not in ALLOWED_DATA:
+        print(f"data type of {data_type} is not supported", file=sys.stderr)
+        return
+
+    try:
+        params = {}
+        if start is not None:
+            params['start'] = start.isoformat()
+        if end is not None:
+            params['end'] = end.isoformat()
+        if columnar:
+            params['format'] = 'columnar'
+        with requests.get(f"{SERVICE_URL}/stream/{data_type}/{user_id}/{interval}", params=params, stream=True) as res:
+            if res.status_code != 200:
+                print(f"Request failed with status code: {res.status_code} - {res.text}", file=sys.stderr)
+                return
+
+            unpacker = msgpack.Unpacker()
+            for content in res.iter_content(chunk_size=65536):
+                unpacker.feed(content)
+                for chunk in unpacker:
+                    yield pd.DataFrame({
+                        'timestamp': decode_timestamps(chunk),
+                        'data': decode_values(chunk, chunk.get('data'))
+                    })
+
+    except requests.exceptions.RequestException as e:
+        print(f"Error occurred: {e}", file=sys.stderr)
+
+def get_bounds(user_id, data_type):
+    """
+    Fetch the first and last sample time of a metric for a given user.
+    Args:
+        user_id (int): The ID of the user.
+        data_type (str): Metric name, as accepted by get_data.
+
+    Returns:
+        tuple: (first, last) as pd.Timestamp, or None if the request failed or there is no data.
+    """
+
+    if data_type not in ALLOWED_DATA:
+        print(f"data type of {data_type} is not supported", file=sys.stderr)
+        return None
+
+    try:
+        res = requests.get(f"{SERVICE_URL}/bounds/{data_type}/{user_id}")
+
+        if res.status_code != 200:
+            print(f"Request failed with status code: {res.status_code} - {res.text}", file=sys.stderr)
+            return None
+
+        res_data = msgpack.unpackb(res.content)
+        if res_data.get('first') is None:
+            return None
+        return pd.to_datetime(res_data['first'], unit='ms'), pd.to_datetime(res_data['last'], unit='ms')
+
+    except requests.exceptions.RequestException as e:
+        print(f"Error occurred: {e}", file=sys.stderr)
+        return None
+
+def get_latest(user_id, data_type, after=None, limit=None, columnar=True):
+    """
+    Fetch the newest stored samples of a metric, for live charts.
+    Args:
+        user_id (int): The ID of the user.
+        data_type (str): Metric name, as accepted by get_data.
+        after (int, optional): Cursor of a previous call, only newer samples are returned.
+        limit (int, optional): Return at most this many of the newest samples.
+        columnar (bool, optional): Use the binary columnar wire format (default True).
+
+    Returns:
+        tuple: (pd.DataFrame with timestamps and data, cursor for the next call), or None on failure.
+            The cursor is None when nothing was returned.
+    """
+
+    if data_type not in ALLOWED_DATA:
+        print(f"data type of {data_type} is not supported", file=sys.stderr)
+        return None
+
+    try:
+        params = {}
+        if after is not None:
+            params['after'] = after
+        if limit is not None:
+            params['limit'] = limit
+        if columnar:
+            params['format'] = 'columnar'
+        res = requests.get(f"{SERVICE_URL}/latest/{data_type}/{user_id}", params=params)
+
+        if res.status_code != 200:
+            print(f"Request failed with status code: {res.status_code} - {res.text}", file=sys.stderr)
+            return None
+
+        res_data = msgpack.unpackb(res.content)
+        frame = pd.DataFrame({
+            'timestamp': decode_timestamps(res_data),
+            'data': decode_values(res_data, res_data.get('data'))
         })
+        return frame, res_data.get('cursor')
 
     except requests.exceptions.RequestException as e:
         print(f"Error occurred: {e}", file=sys.stderr)
@@ -1,26 +1,131 @@
 import psycopg2
+import psycopg2.pool
 import logging
+import threading
+import time
 import numpy as np
-import pandas as pd
-from datetime import timedelta
+from datetime import datetime, timedelta
+
+# Connections shared by every DataAccess in the process. psycopg2 pools close
+# anything returned above minconn, so all of them are opened and kept.
+POOL_SIZE = 5
+# Seconds a request waits for a free pooled connection
+POOL_TIMEOUT = 10.0
+# Planner settings of the pooled connections. At Postgres' defaults (a random
+# page read costing 4, parallel workers) an hour of samples is read with a
+# sequential or parallel scan and a sort, two to ten times slower than walking
+# the timestamp and (User_Id, timestamp_id) indexes in order.
+PLANNER_SETTINGS = {'random_page_cost': 1.1, 'max_parallel_workers_per_gather': 0}
+
+# Seconds a user id that was found in Users is trusted without asking again
+USER_CACHE_TTL = 300.0
+
+_pool = None
+_pool_lock = threading.Lock()
+# Bounds concurrent borrowers, so a busy pool makes requests wait instead of failing
+_pool_slots = threading.BoundedSemaphore(POOL_SIZE)
+
+# user id -> time.monotonic() at which its validation expires
+_valid_users = {}
+_valid_users_lock = threading.Lock()
+
+def get_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = psycopg2.pool.ThreadedConnectionPool(
+                POOL_SIZE, POOL_SIZE, dbname='car_data', user='mitchellbreust',
+                options=' '.join(f"-c {name}={value}" for name, value in PLANNER_SETTINGS.items())
+            )
+            logging.info("Database connection pool created.")
+        return _pool
+
+# Metric -> (view over the per-metric tables, value column of that view)
+METRIC_VIEWS = {
+    'speed': ('UserSpeed', 'speed'),
+    'fuel_level': ('UserFuelLevel', 'fuel'),
+    'fuel_cons': ('UserFuelConsumption', 'fuel_consumption'),
+    'maf': ('UserMassAirFlow', 'air_flow'),
+    'oxygen': ('UserOxygenLevel', 'oxygen_level'),
+    'throttle': ('UserThrottlePosition', 'throttle_position'),
+    'coolant': ('UserCoolantTemperature', 'coolant_temperature'),
+    'intake_manifold': ('UserIntakeManifoldLevel', 'intake_manifold_level'),
+    'rpm': ('UserRPM', 'rpm'),
+}
+
+# Metric -> (per-metric table, value column), for joining several metrics on timestamp_id
+METRIC_TABLES = {
+    'speed': ('Speed_kph', 'speed'),
+    'fuel_level': ('Fuel_level', 'fuel'),
+    'fuel_cons': ('Fuel_cons', 'consumption'),
+    'maf': ('Mass_air_flow', 'air_flow'),
+    'oxygen': ('Oxygen', 'oxygen_level'),
+    'throttle': ('Throttle', 'position'),
+    'coolant': ('Coolant', 'temp'),
+    'intake_manifold': ('Intake_manifold', 'level'),
+    'rpm': ('RPM', 'amount'),
+}
+
+# Metric -> column of the wide telemetry table (database/telemetry.sql)
+TELEMETRY_COLUMNS = {
+    'speed': 'speed',
+    'fuel_level': 'fuel_level',
+    'fuel_cons': 'fuel_cons',
+    'maf': 'mass_air_flow',
+    'oxygen': 'oxygen',
+    'throttle': 'throttle',
+    'coolant': 'coolant',
+    'intake_manifold': 'intake_manifold',
+    'rpm': 'rpm',
+}
+
+# Dashboard interval -> bucket width in seconds
+INTERVAL_SECONDS = {
+    '5s': 5,
+    '30s': 30,
+    '2min': 120,
+    '30min': 1800,
+    '2hours': 7200,
+}
+
+EPOCH = datetime(1970, 1, 1)
+
+# Most samples get_latest returns in one call
+LATEST_LIMIT = 600
+
+# Rows fetched from the server-side cursor per streamed chunk
+STREAM_CHUNK_SIZE = 10000
 
 class DataAccess:
-    def __init__(self, user_id) -> None:
+    def __init__(self, user_id, storage='narrow', use_rollups=False) -> None:
+        if storage not in ('narrow', 'wide'):
+            raise ValueError(f"Unknown storage layout: {storage}")
         self.connection = None
         self.cur = None
         self.user_id = user_id
+        self.storage = storage
+        self.use_rollups = use_rollups
 
+        # Set when the connection failed, so it is discarded instead of returned to the pool
+        self.broken = False
+
+        self.holds_slot = _pool_slots.acquire(timeout=POOL_TIMEOUT)
+        if not self.holds_slot:
+            raise RuntimeError("Timed out waiting for a database connection.")
         try:
-            self.connection = psycopg2.connect(dbname='car_data', user='mitchellbreust')
+            self.connection = get_pool().getconn()
+            if self.connection.closed:
+                get_pool().putconn(self.connection, close=True)
+                self.connection = get_pool().getconn()
             self.cur = self.connection.cursor()
-            logging.info("Database connection established.")
         except psycopg2.DatabaseError as e:
             logging.error(f"Database connection error occurred: {e}")
-            if self.connection:
-                self.connection.rollback()
+            self.broken = True
+            self.close_data_access()
             raise
         except Exception as e:
             logging.error(f"An unexpected error occurred: {e}")
+            self.close_data_access()
             raise
 
     def close_data_access(self):
@@ -34,88 +139,366 @@ class DataAccess:
 
         if self.connection:
             try:
-                self.connection.close()
-                logging.info("Database connection closed.")
+                # Returned idle (no open transaction) to the pool, or closed if it failed
+                if not self.broken and not self.connection.closed:
+                    self.connection.rollback()
             except psycopg2.Error as e:
-                logging.error(f"Error closing connection: {e}")
+                logging.error(f"Error resetting connection: {e}")
+                self.broken = True
             finally:
+                get_pool().putconn(self.connection, close=self.broken or bool(self.connection.closed))
                 self.connection = None
 
+        if self.holds_slot:
+            self.holds_slot = False
+            _pool_slots.release()
+
     def _is_valid_user_id(self, user_id) -> bool:
+        with _valid_users_lock:
+            expires = _valid_users.get(user_id)
+        if expires is not None and expires > time.monotonic():
+            return True
+
         try:
             self.cur.execute("SELECT id FROM Users WHERE id = %s", (user_id,))
             result = self.cur.fetchone()
+            if result is not None:
+                with _valid_users_lock:
+                    _valid_users[user_id] = time.monotonic() + USER_CACHE_TTL
             return result is not None
         except psycopg2.DatabaseError as e:
             logging.error(f"Database error during user_id validation: {e}")
-            if self.connection:
-                    self.connection.rollback()
-                    raise
+            self.broken = isinstance(e, psycopg2.OperationalError)
+            if self.connection and not self.broken:
+                self.connection.rollback()
+            raise
         except Exception as e:
             logging.error(f"Unexpected error during user_id validation: {e}")
             raise
 
-    def get_speed(self, data_interval):
-        return self._execute_query("SELECT * FROM UserSpeed WHERE User_Id = %s", (self.user_id,), data_interval)
+    def get_speed(self, data_interval, start=None, end=None):
+        return self.get_metric('speed', data_interval, start, end)
 
-    def get_fuel_level(self, data_interval):
-        return self._execute_query("SELECT * FROM UserFuelLevel WHERE User_Id = %s", (self.user_id,), data_interval)
+    def get_fuel_level(self, data_interval, start=None, end=None):
+        return self.get_metric('fuel_level', data_interval, start, end)
 
-    def get_fuel_cons(self, data_interval):
-        return self._execute_query("SELECT * FROM UserFuelConsumption WHERE User_Id = %s", (self.user_id,), data_interval)
+    def get_fuel_cons(self, data_interval, start=None, end=None):
+        return self.get_metric('fuel_cons', data_interval, start, end)
 
-    def get_maf(self, data_interval):
-        return self._execute_query("SELECT * FROM UserMassAirFlow WHERE User_Id = %s", (self.user_id,), data_interval)
+    def get_maf(self, data_interval, start=None, end=None):
+        return self.get_metric('maf', data_interval, start, end)
 
-    def get_oxygen(self, data_interval):
-        return self._execute_query("SELECT * FROM UserOxygenLevel WHERE User_Id = %s", (self.user_id,), data_interval)
+    def get_oxygen(self, data_interval, start=None, end=None):
+        return self.get_metric('oxygen', data_interval, start, end)
 
-    def get_throttle(self, data_interval):
-        return self._execute_query("SELECT * FROM UserThrottlePosition WHERE User_Id = %s", (self.user_id,), data_interval)
+    def get_throttle(self, data_interval, start=None, end=None):
+        return self.get_metric('throttle', data_interval, start, end)
 
-    def get_coolant(self, data_interval):
-        return self._execute_query("SELECT * FROM UserCoolantTemperature WHERE User_Id = %s", (self.user_id,), data_interval)
+    def get_coolant(self, data_interval, start=None, end=None):
+        return self.get_metric('coolant', data_interval, start, end)
 
-    def get_intake_manifold(self, data_interval):
-        return self._execute_query("SELECT * FROM UserIntakeManifoldLevel WHERE User_Id = %s", (self.user_id,), data_interval)
+    def get_intake_manifold(self, data_interval, start=None, end=None):
+        return self.get_metric('intake_manifold', data_interval, start, end)
 
-    def get_rpm(self, data_interval):
-        return self._execute_query("SELECT * FROM UserRPM WHERE User_Id = %s", (self.user_id,), data_interval)
+    def get_rpm(self, data_interval, start=None, end=None):
+        return self.get_metric('rpm', data_interval, start, end)
 
-    def _execute_query(self, query, params, interval):
-        if not self.cur:
-            logging.error("Cursor is not initialized.")
-            return None, None
+    def get_metric(self, metric, data_interval, start=None, end=None):
+        # Bucketing happens in Postgres (epoch floor + GROUP BY), so only the
+        # aggregated points for [start, end) cross the wire
+        if self.use_rollups:
+            return self._get_rollup(metric, data_interval, start, end)
+
+        query, params = self._metric_query(metric, data_interval, start, end)
+        return self._execute_query(query, params)
 
+    def stream_metric(self, metric, data_interval, start=None, end=None, chunk_size=STREAM_CHUNK_SIZE):
+        # Yields (timestamps, values) chunks of at most chunk_size rows read
+        # through a server-side cursor, so memory does not grow with the range.
+        # data_interval 'raw' streams the stored samples without bucketing.
+        if data_interval != 'raw' and self.use_rollups:
+            query, params = self._rollup_query(metric, data_interval, start, end)
+        else:
+            query, params = self._metric_query(metric, data_interval, start, end)
+
+        cursor = self.connection.cursor(name='metric_stream')
         try:
-            self.cur.execute(query, params)
-            result = self.cur.fetchall()
+            cursor.itersize = chunk_size
+            cursor.execute(query, params)
+            while True:
+                rows = cursor.fetchmany(chunk_size)
+                if not rows:
+                    break
+                yield (np.array([row[0] for row in rows], dtype='datetime64[ns]'),
+                       np.array([row[1] for row in rows], dtype=np.float64))
+        except psycopg2.DatabaseError as e:
+            logging.error(f"Database error while streaming: {e}")
+            self.broken = isinstance(e, psycopg2.OperationalError)
+            raise
+        finally:
+            if not cursor.closed and not self.connection.closed:
+                try:
+                    cursor.close()
+                except psycopg2.Error:
+                    self.broken = True
 
-            # Unpack the result into three separate lists
-            user_ids, timestamps, data = zip(*result)
+    def get_latest(self, metric, after=None, limit=LATEST_LIMIT):
+        # The newest stored samples (not bucketed) after `after`, at most limit, oldest first.
+        # Walks the timestamp index backwards and stops after limit rows.
+        if self.storage == 'wide':
+            column = TELEMETRY_COLUMNS[metric]
+            conditions = ["user_id = %s", f"{column} IS NOT NULL"]
+            params = [self.user_id]
+            if after is not None:
+                conditions.append("ts > %s")
+                params.append(after)
+            newest = f"""
+                SELECT ts AS timestamp, {column} AS value FROM telemetry
+                WHERE {' AND '.join(conditions)}
+                ORDER BY ts DESC LIMIT %s
+            """
+        else:
+            table, column = METRIC_TABLES[metric]
+            conditions = []
+            params = [self.user_id]
+            if after is not None:
+                conditions.append("t.timestamp > %s")
+                params.append(after)
+            newest = f"""
+                SELECT t.timestamp, m.{column} AS value
+                FROM timestamps t JOIN {table} m ON m.timestamp_id = t.id AND m.User_Id = %s
+                {'WHERE ' + ' AND '.join(conditions) if conditions else ''}
+                ORDER BY t.timestamp DESC LIMIT %s
+            """
+        params.append(limit)
 
-            # Convert timestamps and data to NumPy arrays
-            timestamps = np.array(timestamps)
-            data = np.array(data)
+        query = f"SELECT timestamp, value FROM ({newest}) newest ORDER BY timestamp"
+        return self._execute_query(query, tuple(params))
 
-            # Convert timestamps to a Pandas datetime index
-            timestamps = pd.to_datetime(timestamps)
+    def get_bounds(self, metric):
+        # (first, last) sample time of metric for the user, (None, None) without data.
+        # Each end is one index walk that stops at the first match.
+        if self.storage == 'wide':
+            column = TELEMETRY_COLUMNS[metric]
+            query = f"""
+                SELECT
+                    (SELECT ts FROM telemetry WHERE user_id = %s AND {column} IS NOT NULL ORDER BY ts LIMIT 1),
+                    (SELECT ts FROM telemetry WHERE user_id = %s AND {column} IS NOT NULL ORDER BY ts DESC LIMIT 1)
+            """
+        else:
+            table, _ = METRIC_TABLES[metric]
+            query = f"""
+                SELECT
+                    (SELECT t.timestamp FROM timestamps t JOIN {table} m ON m.timestamp_id = t.id AND m.User_Id = %s
+                     ORDER BY t.timestamp LIMIT 1),
+                    (SELECT t.timestamp FROM timestamps t JOIN {table} m ON m.timestamp_id = t.id AND m.User_Id = %s
+                     ORDER BY t.timestamp DESC LIMIT 1)
+            """
 
-            # Determine the resample interval
+        try:
+            self.cur.execute(query, (self.user_id, self.user_id))
+            return self.cur.fetchone()
+        except psycopg2.DatabaseError as e:
+            logging.error(f"Database error during query execution: {e}")
+            self.broken = isinstance(e, psycopg2.OperationalError)
+            if self.connection and not self.broken:
+                self.connection.rollback()
+            return None, None
+
+    def _metric_query(self, metric, data_interval, start=None, end=None):
+        if self.storage == 'wide':
+            # One row per sample window, no joins needed
+            source, time_column, value_column = 'telemetry', 'ts', TELEMETRY_COLUMNS[metric]
+        else:
+            (source, value_column), time_column = METRIC_VIEWS[metric], 'timestamp'
+
+        conditions = ["user_id = %s", f"{value_column} IS NOT NULL"]
+        params = [self.user_id]
+        if start is not None:
+            conditions.append(f"{time_column} >= %s")
+            params.append(start)
+        if end is not None:
+            conditions.append(f"{time_column} < %s")
+            params.append(end)
+
+        if data_interval == 'raw':
+            query = f"""
+                SELECT {time_column}, {value_column}
+                FROM {source}
+                WHERE {' AND '.join(conditions)}
+                ORDER BY {time_column}
+            """
+            return query, tuple(params)
+
+        bucket_seconds = INTERVAL_SECONDS[data_interval]
+        query = f"""
+            SELECT
+                to_timestamp(floor(extract(epoch FROM {time_column}) / %s) * %s) AT TIME ZONE 'UTC' AS bucket,
+                avg({value_column})
+            FROM {source}
+            WHERE {' AND '.join(conditions)}
+            GROUP BY bucket
+            ORDER BY bucket
+        """
+        return query, (bucket_seconds, bucket_seconds, *params)
+
+    def _get_rollup(self, metric, data_interval, start=None, end=None):
+        query, params = self._rollup_query(metric, data_interval, start, end)
+        return self._execute_query(query, params)
+
+    def _rollup_query(self, metric, data_interval, start=None, end=None):
+        # Precomputed buckets (database/rollups.sql), a read is a primary key range scan
+        bucket_seconds = INTERVAL_SECONDS[data_interval]
+        conditions = ["user_id = %s", "metric = %s", "bucket_seconds = %s"]
+        params = [self.user_id, TELEMETRY_COLUMNS[metric], bucket_seconds]
+        if start is not None:
+            # The bucket containing start is returned whole, rollups cannot be split
+            epoch_seconds = int((start - EPOCH).total_seconds())
+            conditions.append("bucket >= %s")
+            params.append(EPOCH + timedelta(seconds=epoch_seconds - epoch_seconds % bucket_seconds))
+        if end is not None:
+            conditions.append("bucket < %s")
+            params.append(end)
+
+        query = f"""
+            SELECT bucket, sum / count
+            FROM metric_rollups
+            WHERE {' AND '.join(conditions)}
+            ORDER BY bucket
+        """
+        return query, tuple(params)
+
+    def get_metrics(self, metrics, data_interval, start=None, end=None):
+        # Several metrics bucketed on the same timestamps in one query. Returns
+        # (timestamps, {metric: values}), NaN where a metric has no samples in a bucket.
+        metrics = list(metrics)
+        if self.use_rollups:
+            query, params = self._rollups_query(metrics, data_interval, start, end)
+        elif self.storage == 'wide':
+            query, params = self._telemetry_query(metrics, data_interval, start, end)
+        else:
+            query, params = self._joined_query(metrics, data_interval, start, end)
+
+        timestamps, columns = self._execute_columns(query, params, len(metrics))
+        if timestamps is None:
+            return None, None
+        return timestamps, dict(zip(metrics, columns))
+
+    def _joined_query(self, metrics, data_interval, start, end):
+        # Each metric table is bucketed on its own, then the buckets are FULL
+        # JOINed. Joining the raw rows on timestamp_id first would repeat a
+        # metric's rows once per matching row of every other table.
+        bucket_seconds = INTERVAL_SECONDS[data_interval]
+        conditions = []
+        range_params = []
+        if start is not None:
+            conditions.append("t.timestamp >= %s")
+            range_params.append(start)
+        if end is not None:
+            conditions.append("t.timestamp < %s")
+            range_params.append(end)
+
+        selects = []
+        params = []
+        for index, metric in enumerate(metrics):
+            table, column = METRIC_TABLES[metric]
+            selects.append(f"""
+                (SELECT
+                    to_timestamp(floor(extract(epoch FROM t.timestamp) / %s) * %s) AT TIME ZONE 'UTC' AS bucket,
+                    avg(m.{column}) AS m{index}
+                FROM timestamps t
+                JOIN {table} m ON m.timestamp_id = t.id AND m.User_Id = %s
+                {'WHERE ' + ' AND '.join(conditions) if conditions else ''}
+                GROUP BY 1) b{index}
+            """)
+            params.extend((bucket_seconds, bucket_seconds, self.user_id, *range_params))
 
-            # Create a DataFrame and resample the data
-            df = pd.DataFrame({'timestamp': timestamps, 'data': data})
-            df.set_index('timestamp', inplace=True)
-            df_resampled = df.resample(interval).mean().dropna()
+        query = f"""
+            SELECT bucket, {', '.join(f'm{index}' for index in range(len(metrics)))}
+            FROM {selects[0]} {' '.join(f'FULL JOIN {select} USING (bucket)' for select in selects[1:])}
+            ORDER BY bucket
+        """
+        return query, tuple(params)
+
+    def _telemetry_query(self, metrics, data_interval, start, end):
+        bucket_seconds = INTERVAL_SECONDS[data_interval]
+        columns = [TELEMETRY_COLUMNS[metric] for metric in metrics]
+        conditions = ["user_id = %s", f"({' OR '.join(f'{column} IS NOT NULL' for column in columns)})"]
+        params = [bucket_seconds, bucket_seconds, self.user_id]
+        if start is not None:
+            conditions.append("ts >= %s")
+            params.append(start)
+        if end is not None:
+            conditions.append("ts < %s")
+            params.append(end)
+
+        query = f"""
+            SELECT
+                to_timestamp(floor(extract(epoch FROM ts) / %s) * %s) AT TIME ZONE 'UTC' AS bucket,
+                {', '.join(f'avg({column})' for column in columns)}
+            FROM telemetry
+            WHERE {' AND '.join(conditions)}
+            GROUP BY bucket
+            ORDER BY bucket
+        """
+        return query, tuple(params)
+
+    def _rollups_query(self, metrics, data_interval, start, end):
+        # Rollup rows pivoted to one column per metric
+        bucket_seconds = INTERVAL_SECONDS[data_interval]
+        names = [TELEMETRY_COLUMNS[metric] for metric in metrics]
+        params = []
+        averages = []
+        for name in names:
+            averages.append("sum(sum) FILTER (WHERE metric = %s) / sum(count) FILTER (WHERE metric = %s)")
+            params.extend((name, name))
+
+        conditions = ["user_id = %s", "bucket_seconds = %s", "metric = ANY(%s)"]
+        params.extend((self.user_id, bucket_seconds, names))
+        if start is not None:
+            epoch_seconds = int((start - EPOCH).total_seconds())
+            conditions.append("bucket >= %s")
+            params.append(EPOCH + timedelta(seconds=epoch_seconds - epoch_seconds % bucket_seconds))
+        if end is not None:
+            conditions.append("bucket < %s")
+            params.append(end)
+
+        query = f"""
+            SELECT bucket, {', '.join(averages)}
+            FROM metric_rollups
+            WHERE {' AND '.join(conditions)}
+            GROUP BY bucket
+            ORDER BY bucket
+        """
+        return query, tuple(params)
+
+    def _execute_query(self, query, params):
+        timestamps, columns = self._execute_columns(query, params, 1)
+        if timestamps is None:
+            return None, None
+        return timestamps, columns[0]
+
+    def _execute_columns(self, query, params, count):
+        if not self.cur:
+            logging.error("Cursor is not initialized.")
+            return None, None
+
+        try:
+            self.cur.execute(query, params)
+            result = self.cur.fetchall()
 
-            # Get the resampled timestamps and data
-            timestamps_resampled = df_resampled.index.to_numpy()
-            data_resampled = df_resampled['data'].to_numpy()
+            # Rows are already (bucket, average, ...) in time order, NULL averages become NaN
+            timestamps = np.array([row[0] for row in result], dtype='datetime64[ns]')
+            columns = [
+                np.array([row[i] for row in result], dtype=np.float64)
+                for i in range(1, count + 1)
+            ]
 
-            return timestamps_resampled, data_resampled
+            return timestamps, columns
         except psycopg2.DatabaseError as e:
             logging.error(f"Database error during query execution: {e}")
-            if self.connection:
+            self.broken = isinstance(e, psycopg2.OperationalError)
+            if self.connection and not self.broken:
                 self.connection.rollback()
             return None, None
         except Exception as e:
@@ -0,0 +1,52 @@
+import numpy as np
+
+# Smallest point budget LTTB can honour: the first and last point plus one per bucket
+MIN_POINTS = 3
+
+def lttb_indices(x, y, threshold):
+    # Largest-Triangle-Three-Buckets: indices of `threshold` points of (x, y),
+    # x ascending, keeping the ones that shape the line. The first and last
+    # points are always kept. Each bucket is scored in one vectorised step, only
+    # the walk from bucket to bucket is a Python loop.
+    n = len(x)
+    if threshold >= n or threshold < MIN_POINTS:
+        return np.arange(n)
+
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+
+    # threshold - 2 buckets over the points between the first and the last
+    edges = np.linspace(1, n - 1, threshold - 1).astype(np.int64)
+    counts = np.diff(edges)
+    average_x = np.add.reduceat(x[:n - 1], edges[:-1]) / counts
+    average_y = np.add.reduceat(y[:n - 1], edges[:-1]) / counts
+    # Each bucket is scored against the average of the next one, the last against the last point
+    next_x = np.append(average_x[1:], x[n - 1])
+    next_y = np.append(average_y[1:], y[n - 1])
+
+    selected = np.empty(threshold, dtype=np.int64)
+    selected[0] = 0
+    selected[-1] = n - 1
+    previous = 0
+    for bucket in range(threshold - 2):
+        lo, hi = edges[bucket], edges[bucket + 1]
+        ax, ay = x[previous], y[previous]
+        # Twice the triangle area, the constant factor does not change the argmax
+        areas = np.abs((ax - next_x[bucket]) * (y[lo:hi] - ay) - (ax - x[lo:hi]) * (next_y[bucket] - ay))
+        previous = lo + int(np.argmax(areas))
+        selected[bucket + 1] = previous
+    return selected
+
+def downsample(timestamps, columns, max_points):
+    # Shrinks series sharing timestamps to about max_points each. Every column
+    # is reduced over its non-NaN points and the union of the kept rows is
+    # returned, so series stay aligned on the same timestamps.
+    if len(timestamps) <= max_points:
+        return timestamps, columns
+
+    x = timestamps.astype(np.int64).astype(np.float64)
+    keep = np.zeros(len(timestamps), dtype=bool)
+    for column in columns:
+        present = np.flatnonzero(~np.isnan(column))
+        keep[present[lttb_indices(x[present], column[present], max_points)]] = True
+    return timestamps[keep], [column[keep] for column in columns]
@@ -0,0 +1,255 @@
+import psycopg2
+import psycopg2.extensions
+import logging
+import select
+import threading
+import time
+import uuid
+import numpy as np
+from collections import OrderedDict, deque
+from datetime import datetime
+
+# Upper bound on the packed responses plus series arrays held in memory
+CACHE_MAX_BYTES = 64 * 1024 * 1024
+
+# Channel DatabaseWriter notifies on after every commit ('<user id> <earliest epoch second>')
+WRITE_CHANNEL = 'metric_writes'
+
+# Seconds between attempts to reconnect the listener
+LISTEN_BACKOFF = 5.0
+
+# Write notifications remembered per user, to tell a ?since= client what changed before its cursor
+WRITE_LOG_SIZE = 1024
+
+def to_datetime(value):
+    # np.datetime64 -> naive datetime, as the queries take them
+    return value.astype('datetime64[us]').astype(datetime)
+
+class CacheEntry:
+    __slots__ = ('timestamps', 'columns', 'packed', 'watermark', 'bucket_seconds', 'writes', 'size')
+
+    def __init__(self, timestamps, columns, packed, watermark, bucket_seconds, writes) -> None:
+        self.timestamps = timestamps
+        self.columns = columns
+        self.packed = packed
+        # Buckets before this are closed and kept, from here on they are fetched again
+        self.watermark = watermark
+        self.bucket_seconds = bucket_seconds
+        # (cache generation, write notifications for the user) when it was fetched
+        self.writes = writes
+        self.size = len(packed) + timestamps.nbytes + sum(column.nbytes for column in columns)
+
+class ResponseCache:
+    # LRU of packed series responses keyed by (user, metrics, interval, range, ...).
+    # Closed buckets stay cached, only the trailing bucket from the watermark on
+    # is fetched again, and only after the user's data was written to. A write
+    # notification for an older timestamp lowers the watermark of that user's
+    # entries. Without a listening connection every lookup refetches the tail.
+    def __init__(self, max_bytes=CACHE_MAX_BYTES, dbname='car_data', user='mitchellbreust') -> None:
+        self.max_bytes = max_bytes
+        self.dbname = dbname
+        self.user = user
+        self.entries = OrderedDict()
+        self.size = 0
+        self.lock = threading.Lock()
+
+        # user id -> number of write notifications received, and a counter
+        # bumped whenever the cache is cleared
+        self.writes = {}
+        self.generation = 0
+        # user id -> (write number, earliest epoch second or None) of the latest notifications
+        self.write_log = {}
+        # Tells write cursors of this process from those of an earlier one
+        self.instance = uuid.uuid4().hex[:8]
+        self.listening = False
+        self.listener = None
+
+        self.hits = 0
+        self.partial_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key, user_id, bucket_seconds, start, end, fetch, pack):
+        # fetch(start, end) -> (timestamps, [columns]) or (None, None)
+        # pack(timestamps, columns) -> bytes
+        entry = self._lookup(key, user_id, bucket_seconds, start, end, fetch, pack)
+        return None if entry is None else entry.packed
+
+    def get_series(self, key, user_id, bucket_seconds, start, end, fetch, pack):
+        # Same lookup as get, returns the (timestamps, [columns]) the cached
+        # response was packed from, or (None, None)
+        entry = self._lookup(key, user_id, bucket_seconds, start, end, fetch, pack)
+        return (None, None) if entry is None else (entry.timestamps, entry.columns)
+
+    def _lookup(self, key, user_id, bucket_seconds, start, end, fetch, pack):
+        self.start_listener()
+
+        with self.lock:
+            entry = self.entries.get(key)
+            writes = self._version(user_id)
+            listening = self.listening
+            if entry is not None:
+                self.entries.move_to_end(key)
+                closed = end is not None and entry.watermark is not None and np.datetime64(end) <= entry.watermark
+                if closed or (listening and entry.writes == writes):
+                    self.hits += 1
+                    return entry
+
+        if entry is None or entry.watermark is None:
+            timestamps, columns = fetch(start, end)
+            if timestamps is None:
+                return None
+            with self.lock:
+                self.misses += 1
+        else:
+            # Refetch from the watermark and splice onto the closed buckets
+            tail_start = to_datetime(entry.watermark)
+            if start is not None and start > tail_start:
+                tail_start = start
+            tail_timestamps, tail_columns = fetch(tail_start, end)
+            if tail_timestamps is None:
+                return None
+            keep = np.searchsorted(entry.timestamps, entry.watermark, side='left')
+            timestamps = np.concatenate((entry.timestamps[:keep], tail_timestamps))
+            columns = [np.concatenate((column[:keep], tail)) for column, tail in zip(entry.columns, tail_columns)]
+            with self.lock:
+                self.partial_hits += 1
+
+        packed = pack(timestamps, columns)
+        # The last bucket may still be filling up, everything before it is closed
+        watermark = timestamps[-1] if len(timestamps) else None
+        entry = CacheEntry(timestamps, columns, packed, watermark, bucket_seconds, writes)
+        self._store(key, entry, user_id)
+        return entry
+
+    def _store(self, key, entry, user_id):
+        with self.lock:
+            if self._version(user_id) != entry.writes:
+                # A write landed while fetching, its range is unknown so the result is not kept
+                return
+            old = self.entries.pop(key, None)
+            if old is not None:
+                self.size -= old.size
+            if entry.size > self.max_bytes:
+                return
+            self.entries[key] = entry
+            self.size += entry.size
+            while self.size > self.max_bytes:
+                _, evicted = self.entries.popitem(last=False)
+                self.size -= evicted.size
+                self.evictions += 1
+
+    def _version(self, user_id):
+        return self.generation, self.writes.get(user_id, 0)
+
+    def invalidate(self, user_id, since=None):
+        # Reopens the buckets of user_id from epoch second `since` on, or drops all of them
+        with self.lock:
+            count = self.writes.get(user_id, 0) + 1
+            self.writes[user_id] = count
+            self.write_log.setdefault(user_id, deque(maxlen=WRITE_LOG_SIZE)).append((count, since))
+            for key in [key for key in self.entries if key[0] == user_id]:
+                entry = self.entries[key]
+                if since is None or entry.watermark is None:
+                    self.entries.pop(key)
+                    self.size -= entry.size
+                    continue
+                bucket = np.datetime64(int(since - since % entry.bucket_seconds), 's')
+                if bucket < entry.watermark:
+                    entry.watermark = bucket.astype(entry.timestamps.dtype)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.size = 0
+            self.generation += 1
+            self.write_log.clear()
+
+    def write_cursor(self, user_id):
+        # Opaque marker of the writes for user_id seen so far, None while writes are not tracked
+        with self.lock:
+            if not self.listening:
+                return None
+            return f"{self.instance}.{self.generation}.{self.writes.get(user_id, 0)}"
+
+    def earliest_write(self, user_id, cursor):
+        # (known, earliest epoch second written for user_id after write_cursor()
+        # returned cursor, None if nothing was). known is False when that cannot
+        # be told: a cursor from another process or listener connection, or
+        # notifications that were not kept.
+        with self.lock:
+            if not self.listening or cursor is None:
+                return False, None
+            try:
+                instance, generation, count = cursor.split('.')
+                generation, count = int(generation), int(count)
+            except ValueError:
+                return False, None
+            if instance != self.instance or generation != self.generation:
+                return False, None
+            latest = self.writes.get(user_id, 0)
+            if count == latest:
+                return True, None
+            log = self.write_log.get(user_id)
+            if count > latest or not log or log[0][0] > count + 1:
+                return False, None
+            written = [since for number, since in log if number > count]
+            if None in written:
+                return False, None
+            return True, min(written)
+
+    def stats(self):
+        with self.lock:
+            lookups = self.hits + self.partial_hits + self.misses
+            return {
+                'entries': len(self.entries),
+                'bytes': self.size,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'partial_hits': self.partial_hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+                'listening': self.listening,
+            }
+
+    def start_listener(self):
+        with self.lock:
+            if self.listener is not None:
+                return
+            self.listener = threading.Thread(target=self._listen, name='cache-listener', daemon=True)
+        self.listener.start()
+
+    def _listen(self):
+        while True:
+            connection = None
+            try:
+                connection = psycopg2.connect(dbname=self.dbname, user=self.user)
+                connection.set_isolation_level(psycopg2.extensions.ISOLATION_LEVEL_AUTOCOMMIT)
+                connection.cursor().execute(f"LISTEN {WRITE_CHANNEL};")
+                # Writes made while nobody listened are unknown, start over
+                self.clear()
+                with self.lock:
+                    self.listening = True
+                logging.info("Response cache listening for writes.")
+
+                while True:
+                    select.select([connection], [], [], LISTEN_BACKOFF)
+                    connection.poll()
+                    while connection.notifies:
+                        self._handle(connection.notifies.pop(0).payload)
+            except psycopg2.Error as e:
+                logging.error(f"Response cache listener lost its connection: {e}")
+            finally:
+                with self.lock:
+                    self.listening = False
+                if connection is not None and not connection.closed:
+                    connection.close()
+            time.sleep(LISTEN_BACKOFF)
+
+    def _handle(self, payload):
+        try:
+            user_id, since = payload.split()
+            self.invalidate(int(user_id), int(since))
+        except ValueError:
+            logging.warning(f"Ignoring malformed write notification: {payload}")
@@ -1,39 +1,197 @@
 from flask import Flask
 from flask import Response
 from data_access import DataAccess
+from data_access import INTERVAL_SECONDS
+from data_access import EPOCH
+from data_access import LATEST_LIMIT
+from response_cache import ResponseCache
+from downsample import downsample
+from downsample import MIN_POINTS
 from flask import abort
+from flask import request
+from flask import stream_with_context
+from werkzeug.exceptions import HTTPException
+from datetime import datetime
+from datetime import timedelta
 import numpy as np
 import msgpack
 import logging
 
 app = Flask(__name__)
 
+# 'wide' reads the telemetry table, once database/migrations/002_telemetry_backfill.sql has been applied
+STORAGE = 'narrow'
+
+# Read the precomputed buckets, once database/rollups.sql and
+# migrations/003_metric_rollups_backfill.sql have been applied and the writer maintains them
+USE_ROLLUPS = False
+
+# Metric names used in the URLs -> DataAccess metric names
+ROUTE_METRICS = {
+    'speed': 'speed',
+    'fuel_level': 'fuel_level',
+    'fuel_consumption': 'fuel_cons',
+    'maf': 'maf',
+    'oxygen': 'oxygen',
+    'throttle': 'throttle',
+    'coolant': 'coolant',
+    'intake_manifold': 'intake_manifold',
+    'rpm': 'rpm',
+}
+
+# Packed responses shared by all requests, see response_cache.py
+response_cache = ResponseCache()
+
 def valid_interval(interval):
     return interval in ['5s', '30s', '2min', '30min', '2hours']
 
-def make_response(timestamp, data):
-    # Convert NumPy arrays to lists for serialization
-    timestamp_list = timestamp.tolist() if isinstance(timestamp, np.ndarray) else timestamp
-    data_list = data.tolist() if isinstance(data, np.ndarray) else data
-
-    # Pack the data using msgpack
-    packed_data = msgpack.packb({'timestamp': timestamp_list, 'data': data_list}, use_bin_type=True)
-    return Response(packed_data, content_type='application/x-msgpack')
-
-@app.get("/speed/<int:user_id>/<string:interval>")
-def get_users_speed(user_id, interval):
+def parse_range():
+    # Optional ?start=...&end=... (ISO 8601) limiting the series to [start, end)
+    try:
+        start = request.args.get('start')
+        end = request.args.get('end')
+        return (datetime.fromisoformat(start) if start else None,
+                datetime.fromisoformat(end) if end else None)
+    except ValueError:
+        abort(400, description='invalid start or end')
+
+def parse_since(start, user_id, bucket_seconds):
+    # Optional ?since=<cursor>&written=<written>, both from a previous response
+    # ('cursor' is epoch ms of its last bucket). Only buckets from there on are
+    # returned, the last one again since it may have grown. A row written since
+    # then for an older time (a window replayed from the pipeline's spool)
+    # moves the start back to that row's bucket. When the writes since cannot
+    # be told, the whole range is returned. Returns the effective start and
+    # where the returned part begins (epoch ms, None for the whole range).
+    since = request.args.get('since')
+    if since is None:
+        return start, None
+    try:
+        since = int(since)
+    except ValueError:
+        abort(400, description='Invalid since')
+
+    known, earliest = response_cache.earliest_write(user_id, request.args.get('written'))
+    if not known:
+        return start, None
+    if earliest is not None:
+        since = min(since, (earliest - earliest % bucket_seconds) * 1000)
+    since_time = EPOCH + timedelta(milliseconds=since)
+    if start is not None and since_time <= start:
+        return start, None
+    return since_time, since
+
+def parse_max_points():
+    # Optional ?max_points=N, the series is reduced with LTTB to about N points
+    max_points = request.args.get('max_points')
+    if max_points is None:
+        return None
+    try:
+        max_points = int(max_points)
+    except ValueError:
+        abort(400, description='Invalid max_points')
+    if max_points < MIN_POINTS:
+        abort(400, description=f'max_points must be at least {MIN_POINTS}')
+    return max_points
+
+# ?dtype= of the columnar format -> little-endian NumPy dtype of the values
+COLUMNAR_DTYPES = {
+    'float64': '<f8',
+    'float32': '<f4',
+}
+
+def parse_format():
+    # ?format=columnar[&dtype=float32] sends raw little-endian arrays in msgpack
+    # bin fields: timestamps as int64 epoch milliseconds, values as float64 (or
+    # float32), with the value dtype under 'dtype'. Returns None for the default
+    # list format, otherwise the value dtype.
+    wire_format = request.args.get('format', 'list')
+    if wire_format == 'list':
+        return None
+    if wire_format != 'columnar':
+        abort(400, description='Invalid format')
+    dtype = request.args.get('dtype', 'float64')
+    if dtype not in COLUMNAR_DTYPES:
+        abort(400, description='Invalid dtype')
+    return COLUMNAR_DTYPES[dtype]
+
+def encode_timestamps(timestamp, dtype):
+    if dtype is None:
+        return timestamp.tolist()
+    return timestamp.astype('datetime64[ms]').astype('<i8').tobytes()
+
+def encode_values(data, dtype):
+    if dtype is None:
+        return data.tolist()
+    return data.astype(dtype).tobytes()
+
+def pack_body(timestamp, data, dtype, fields=None):
+    # 'cursor' is passed back as ?since= to fetch only what is newer, fields are added as they are
+    cursor = int(timestamp[-1].astype('datetime64[ms]').astype(np.int64)) if len(timestamp) else None
+    body = {'timestamp': encode_timestamps(timestamp, dtype), 'data': data, 'cursor': cursor, **(fields or {})}
+    if dtype is not None:
+        body['dtype'] = dtype
+    return msgpack.packb(body, use_bin_type=True)
+
+def pack_series(timestamp, columns, dtype, fields):
+    # One metric: {'timestamp': [...], 'data': [...]}
+    return pack_body(timestamp, encode_values(columns[0], dtype), dtype, fields)
+
+def serve_metrics(user_id, interval, metrics, pack):
     if not valid_interval(interval):
-        abort(400, description='invalid interval')
+        abort(400, description='Invalid interval')
+
+    start, end = parse_range()
+    since_start, since = parse_since(start, user_id, INTERVAL_SECONDS[interval])
+    max_points = parse_max_points()
+    dtype = parse_format()
+    # Passed back with ?since= to catch late writes. Taken before fetching,
+    # so a write during the fetch is caught by the next call.
+    written = response_cache.write_cursor(user_id)
+
+    def packer(since):
+        # 'since': where the response begins for the client to splice it in (None: the whole range)
+        def pack_downsampled(timestamp, columns):
+            # The cache keeps the full series for splicing, only the packed response is reduced
+            if max_points is not None:
+                timestamp, columns = downsample(timestamp, columns, max_points)
+            return pack(timestamp, columns, dtype, {'since': since, 'written': written})
+        return pack_downsampled
 
     data_access = None
-    try:
-        data_access = DataAccess(user_id)
 
-        if not data_access._is_valid_user_id(user_id):
-            abort(400, description=f'invalid user id: {user_id}')
+    def fetch(fetch_start, fetch_end):
+        # Only called when the cache cannot answer, so a hit needs no connection
+        nonlocal data_access
+        if data_access is None:
+            data_access = DataAccess(user_id, STORAGE, USE_ROLLUPS)
+            if not data_access._is_valid_user_id(user_id):
+                abort(400, description=f'Invalid user id: {user_id}')
+        if len(metrics) == 1:
+            timestamp, data = data_access.get_metric(metrics[0], interval, fetch_start, fetch_end)
+            return timestamp, None if data is None else [data]
+        timestamp, series = data_access.get_metrics(metrics, interval, fetch_start, fetch_end)
+        return timestamp, None if series is None else [series[metric] for metric in metrics]
 
-        timestamp, data = data_access.get_speed(interval)
-        return make_response(timestamp, data)
+    try:
+        # ?since= polls share the entry of their whole range, so the moving
+        # cursor does not add an entry per poll, and get the part from since_start
+        key = (user_id, tuple(metrics), interval, start, end, max_points, dtype)
+        if since is None:
+            packed_data = response_cache.get(key, user_id, INTERVAL_SECONDS[interval], start, end, fetch, packer(None))
+        else:
+            timestamp, columns = response_cache.get_series(
+                key, user_id, INTERVAL_SECONDS[interval], start, end, fetch, packer(None)
+            )
+            packed_data = None
+            if timestamp is not None:
+                first = np.searchsorted(timestamp, np.datetime64(since_start), side='left')
+                packed_data = packer(since)(timestamp[first:], [column[first:] for column in columns])
+        if packed_data is None:
+            abort(500, description='Internal server error')
+        return Response(packed_data, content_type='application/x-msgpack')
+    except HTTPException:
+        raise
     except Exception as e:
         logging.error(f"Error while processing request: {e}")
         abort(500, description='Internal server error')
@@ -41,146 +199,124 @@ def get_users_speed(user_id, interval):
         if data_access:
             data_access.close_data_access()
 
+@app.get("/speed/<int:user_id>/<string:interval>")
+def get_users_speed(user_id, interval):
+    return serve_metrics(user_id, interval, ['speed'], pack_series)
+
 @app.get("/fuel_level/<int:user_id>/<string:interval>")
 def get_users_fuel_level(user_id, interval):
-    if not valid_interval(interval):
-        abort(400, description='Invalid interval')
-
-    data_access = None
-    try:
-        data_access = DataAccess(user_id)
-
-        if not data_access._is_valid_user_id(user_id):
-            abort(400, description=f'Invalid user id: {user_id}')
-
-        timestamp, data = data_access.get_fuel_level(interval)
-        return make_response(timestamp, data)
-    except Exception as e:
-        logging.error(f"Error while processing request: {e}")
-        abort(500, description='Internal server error')
-    finally:
-        if data_access:
-            data_access.close_data_access()
+    return serve_metrics(user_id, interval, ['fuel_level'], pack_series)
 
 @app.get("/fuel_consumption/<int:user_id>/<string:interval>")
 def get_users_fuel_consumption(user_id, interval):
-    if not valid_interval(interval):
-        abort(400, description='Invalid interval')
-
-    data_access = None
-    try:
-        data_access = DataAccess(user_id)
-
-        if not data_access._is_valid_user_id(user_id):
-            abort(400, description=f'Invalid user id: {user_id}')
-
-        timestamp, data = data_access.get_fuel_cons(interval)
-        return make_response(timestamp, data)
-    except Exception as e:
-        logging.error(f"Error while processing request: {e}")
-        abort(500, description='Internal server error')
-    finally:
-        if data_access:
-            data_access.close_data_access()
+    return serve_metrics(user_id, interval, ['fuel_cons'], pack_series)
 
 @app.get("/maf/<int:user_id>/<string:interval>")
 def get_users_maf(user_id, interval):
-    if not valid_interval(interval):
-        abort(400, description='Invalid interval')
-
-    data_access = None
-    try:
-        data_access = DataAccess(user_id)
-
-        if not data_access._is_valid_user_id(user_id):
-            abort(400, description=f'Invalid user id: {user_id}')
-
-        timestamp, data = data_access.get_maf(interval)
-        return make_response(timestamp, data)
-    except Exception as e:
-        logging.error(f"Error while processing request: {e}")
-        abort(500, description='Internal server error')
-    finally:
-        if data_access:
-            data_access.close_data_access()
+    return serve_metrics(user_id, interval, ['maf'], pack_series)
 
 @app.get("/oxygen/<int:user_id>/<string:interval>")
 def get_users_oxygen(user_id, interval):
-    if not valid_interval(interval):
-        abort(400, description='Invalid interval')
-
-    data_access = None
-    try:
-        data_access = DataAccess(user_id)
-
-        if not data_access._is_valid_user_id(user_id):
-            abort(400, description=f'Invalid user id: {user_id}')
-
-        timestamp, data = data_access.get_oxygen(interval)
-        return make_response(timestamp, data)
-    except Exception as e:
-        logging.error(f"Error while processing request: {e}")
-        abort(500, description='Internal server error')
-    finally:
-        if data_access:
-            data_access.close_data_access()
+    return serve_metrics(user_id, interval, ['oxygen'], pack_series)
 
 @app.get("/throttle/<int:user_id>/<string:interval>")
 def get_users_throttle(user_id, interval):
-    if not valid_interval(interval):
-        abort(400, description='Invalid interval')
-
-    data_access = None
-    try:
-        data_access = DataAccess(user_id)
-
-        if not data_access._is_valid_user_id(user_id):
-            abort(400, description=f'Invalid user id: {user_id}')
-
-        timestamp, data = data_access.get_throttle(interval)
-        return make_response(timestamp, data)
-    except Exception as e:
-        logging.error(f"Error while processing request: {e}")
-        abort(500, description='Internal server error')
-    finally:
-        if data_access:
-            data_access.close_data_access()
+    return serve_metrics(user_id, interval, ['throttle'], pack_series)
 
 @app.get("/coolant/<int:user_id>/<string:interval>")
 def get_users_coolant(user_id, interval):
-    if not valid_interval(interval):
+    return serve_metrics(user_id, interval, ['coolant'], pack_series)
+
+@app.get("/intake_manifold/<int:user_id>/<string:interval>")
+def get_users_intake_manifold(user_id, interval):
+    return serve_metrics(user_id, interval, ['intake_manifold'], pack_series)
+
+@app.get("/rpm/<int:user_id>/<string:interval>")
+def get_users_rpm(user_id, interval):
+    return serve_metrics(user_id, interval, ['rpm'], pack_series)
+
+@app.get("/metrics/<int:user_id>/<string:interval>")
+def get_users_metrics(user_id, interval):
+    # ?metrics=speed,rpm,... returns every series on shared timestamps in one response
+    names = [name for name in request.args.get('metrics', '').split(',') if name]
+    if not names or any(name not in ROUTE_METRICS for name in names):
+        abort(400, description='Invalid metrics')
+    names = list(dict.fromkeys(names))
+
+    def pack(timestamp, columns, dtype, fields):
+        return pack_body(timestamp, {name: encode_values(column, dtype) for name, column in zip(names, columns)}, dtype, fields)
+
+    return serve_metrics(user_id, interval, [ROUTE_METRICS[name] for name in names], pack)
+
+@app.get("/stream/<string:name>/<int:user_id>/<string:interval>")
+def stream_users_metric(name, user_id, interval):
+    # Long ranges and raw exports ('raw' interval) as a stream of msgpack maps
+    # {'timestamp': [...], 'data': [...]}, one per chunk of STREAM_CHUNK_SIZE rows.
+    # Read it with msgpack.Unpacker, the service never holds more than one chunk.
+    if name not in ROUTE_METRICS:
+        abort(400, description='Invalid metric')
+    if interval != 'raw' and not valid_interval(interval):
         abort(400, description='Invalid interval')
 
+    start, end = parse_range()
+    dtype = parse_format()
+
     data_access = None
     try:
-        data_access = DataAccess(user_id)
-
+        data_access = DataAccess(user_id, STORAGE, USE_ROLLUPS)
         if not data_access._is_valid_user_id(user_id):
             abort(400, description=f'Invalid user id: {user_id}')
-
-        timestamp, data = data_access.get_coolant(interval)
-        return make_response(timestamp, data)
+    except HTTPException:
+        data_access.close_data_access()
+        raise
     except Exception as e:
         logging.error(f"Error while processing request: {e}")
-        abort(500, description='Internal server error')
-    finally:
         if data_access:
             data_access.close_data_access()
+        abort(500, description='Internal server error')
 
-@app.get("/intake_manifold/<int:user_id>/<string:interval>")
-def get_users_intake_manifold(user_id, interval):
-    if not valid_interval(interval):
-        abort(400, description='Invalid interval')
+    def generate():
+        # The pooled connection is held until the last chunk is sent or the client goes away
+        try:
+            for timestamp, data in data_access.stream_metric(ROUTE_METRICS[name], interval, start, end):
+                yield pack_body(timestamp, encode_values(data, dtype), dtype)
+        except Exception as e:
+            logging.error(f"Error while streaming: {e}")
+        finally:
+            data_access.close_data_access()
+
+    return Response(stream_with_context(generate()), content_type='application/x-msgpack')
+
+@app.get("/latest/<string:name>/<int:user_id>")
+def get_users_latest(name, user_id):
+    # Newest stored samples for live charts: ?after=<cursor> returns only those
+    # newer than a previous response's 'cursor', ?limit=N at most N of them.
+    # Not cached, each poll is one short index walk.
+    if name not in ROUTE_METRICS:
+        abort(400, description='Invalid metric')
+    try:
+        after = request.args.get('after')
+        after = None if after is None else EPOCH + timedelta(milliseconds=int(after))
+        limit = min(int(request.args.get('limit', LATEST_LIMIT)), LATEST_LIMIT)
+    except ValueError:
+        abort(400, description='Invalid after or limit')
+    if limit < 1:
+        abort(400, description='Invalid after or limit')
+    dtype = parse_format()
 
     data_access = None
     try:
-        data_access = DataAccess(user_id)
+        data_access = DataAccess(user_id, STORAGE, USE_ROLLUPS)
 
         if not data_access._is_valid_user_id(user_id):
             abort(400, description=f'Invalid user id: {user_id}')
 
-        timestamp, data = data_access.get_intake_manifold(interval)
-        return make_response(timestamp, data)
+        timestamp, data = data_access.get_latest(ROUTE_METRICS[name], after, limit)
+        if timestamp is None:
+            abort(500, description='Internal server error')
+        return Response(pack_body(timestamp, encode_values(data, dtype), dtype), content_type='application/x-msgpack')
+    except HTTPException:
+        raise
     except Exception as e:
         logging.error(f"Error while processing request: {e}")
         abort(500, description='Internal server error')
@@ -188,20 +324,28 @@ def get_users_intake_manifold(user_id, interval):
         if data_access:
             data_access.close_data_access()
 
-@app.get("/rpm/<int:user_id>/<string:interval>")
-def get_users_rpm(user_id, interval):
-    if not valid_interval(interval):
-        abort(400, description='Invalid interval')
+@app.get("/bounds/<string:name>/<int:user_id>")
+def get_users_bounds(name, user_id):
+    # First and last sample time (epoch ms, None without data), for the dashboard
+    # to set up its date and hour pickers without downloading the series
+    if name not in ROUTE_METRICS:
+        abort(400, description='Invalid metric')
 
     data_access = None
     try:
-        data_access = DataAccess(user_id)
+        data_access = DataAccess(user_id, STORAGE, USE_ROLLUPS)
 
         if not data_access._is_valid_user_id(user_id):
             abort(400, description=f'Invalid user id: {user_id}')
 
-        timestamp, data = data_access.get_rpm(interval)
-        return make_response(timestamp, data)
+        first, last = data_access.get_bounds(ROUTE_METRICS[name])
+        packed_data = msgpack.packb({
+            'first': None if first is None else int((first - EPOCH).total_seconds() * 1000),
+            'last': None if last is None else int((last - EPOCH).total_seconds() * 1000),
+        }, use_bin_type=True)
+        return Response(packed_data, content_type='application/x-msgpack')
+    except HTTPException:
+        raise
     except Exception as e:
         logging.error(f"Error while processing request: {e}")
         abort(500, description='Internal server error')
@@ -209,5 +353,10 @@ def get_users_rpm(user_id, interval):
         if data_access:
             data_access.close_data_access()
 
+@app.get("/cache/stats")
+def get_cache_stats():
+    # Hit rates and size of the response cache, for sizing CACHE_MAX_BYTES
+    return response_cache.stats()
+
 if __name__ == "__main__":
     app.run(host="0.0.0.0", port=5000, debug=True)
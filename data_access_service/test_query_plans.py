@@ -0,0 +1,74 @@
+import psycopg2
+import pytest
+from datetime import datetime, timedelta
+from data_access_service.data_access import DataAccess
+from data_access_service.data_access import INTERVAL_SECONDS
+
+# Query-plan regression test for DataAccess's range reads, against the
+# car_data database with database/migrations applied. The large tables are
+# filled inside the test's transaction and rolled back, so the plans do not
+# depend on what the database holds. Skipped when Postgres is not available.
+
+# Samples generated for the test, enough for Postgres to plan as for a long-running car
+ROWS = 200000
+START = datetime(2100, 1, 1)
+
+LARGE_TABLES = ('timestamps', 'speed_kph')
+INDEX_SCANS = ('Index Scan', 'Index Only Scan', 'Bitmap Heap Scan')
+
+@pytest.fixture
+def data_access():
+    try:
+        data_access = DataAccess(user_id=None)
+    except psycopg2.OperationalError as e:
+        pytest.skip(f"Postgres is not available: {e}")
+
+    try:
+        cur = data_access.cur
+        cur.execute("INSERT INTO Users DEFAULT VALUES RETURNING id;")
+        data_access.user_id = cur.fetchone()[0]
+        cur.execute("""
+            INSERT INTO timestamps (timestamp)
+            SELECT %s + make_interval(secs => i) FROM generate_series(1, %s) i;
+        """, (START, ROWS))
+        cur.execute("""
+            INSERT INTO Speed_kph (User_Id, speed, timestamp_id)
+            SELECT %s, 50.0, id FROM timestamps WHERE timestamp > %s;
+        """, (data_access.user_id, START))
+        cur.execute("ANALYZE timestamps; ANALYZE Speed_kph;")
+        yield data_access
+    finally:
+        data_access.connection.rollback()
+        data_access.close_data_access()
+
+def plan_nodes(plan):
+    yield plan
+    for child in plan.get('Plans', []):
+        yield from plan_nodes(child)
+
+def explain(data_access, query, params):
+    data_access.cur.execute(f"EXPLAIN (FORMAT JSON) {query}", params)
+    return list(plan_nodes(data_access.cur.fetchone()[0][0]['Plan']))
+
+def large_table_scans(nodes):
+    return {node['Relation Name']: node['Node Type'] for node in nodes if node.get('Relation Name') in LARGE_TABLES}
+
+def test_raw_range_query_walks_indexes_in_order(data_access):
+    # One hour of stored samples, read in timestamp index order without sorting
+    query, params = data_access._metric_query('speed', 'raw', START + timedelta(hours=1), START + timedelta(hours=2))
+    nodes = explain(data_access, query, params)
+
+    scans = large_table_scans(nodes)
+    assert scans.keys() == set(LARGE_TABLES)
+    assert all(scan in INDEX_SCANS for scan in scans.values()), scans
+    assert not [node for node in nodes if node['Node Type'] == 'Sort']
+
+@pytest.mark.parametrize('interval', INTERVAL_SECONDS)
+def test_bucketed_range_query_uses_indexes(data_access, interval):
+    # Bucketing sorts or hashes the rows of the range, never the whole table
+    query, params = data_access._metric_query('speed', interval, START + timedelta(hours=1), START + timedelta(hours=2))
+    nodes = explain(data_access, query, params)
+
+    scans = large_table_scans(nodes)
+    assert scans.keys() == set(LARGE_TABLES)
+    assert all(scan in INDEX_SCANS for scan in scans.values()), scans
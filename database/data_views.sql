@@ -9,9 +9,7 @@ FROM
 JOIN 
     Fuel_level fl ON u.id = fl.User_Id
 JOIN 
-    timestamps t ON fl.timestamp_id = t.id
-ORDER BY 
-    u.id, t.timestamp;
+    timestamps t ON fl.timestamp_id = t.id;
 
 CREATE VIEW UserFuelConsumption AS
 SELECT 
@@ -23,9 +21,7 @@ FROM
 JOIN 
     Fuel_cons fc ON u.id = fc.User_Id
 JOIN 
-    timestamps t ON fc.timestamp_id = t.id
-ORDER BY 
-    u.id, t.timestamp;
+    timestamps t ON fc.timestamp_id = t.id;
 
 CREATE VIEW UserMassAirFlow AS
 SELECT 
@@ -37,9 +33,7 @@ FROM
 JOIN 
     Mass_air_flow maf ON u.id = maf.User_Id
 JOIN 
-    timestamps t ON maf.timestamp_id = t.id
-ORDER BY 
-    u.id, t.timestamp;
+    timestamps t ON maf.timestamp_id = t.id;
 
 CREATE VIEW UserOxygenLevel AS
 SELECT 
@@ -51,9 +45,7 @@ FROM
 JOIN 
     Oxygen o ON u.id = o.User_Id
 JOIN 
-    timestamps t ON o.timestamp_id = t.id
-ORDER BY 
-    u.id, t.timestamp;
+    timestamps t ON o.timestamp_id = t.id;
 
 
 CREATE VIEW UserSpeed AS
@@ -66,9 +58,7 @@ FROM
 JOIN 
     Speed_kph s ON u.id = s.User_Id
 JOIN 
-    timestamps t ON s.timestamp_id = t.id
-ORDER BY 
-    u.id, t.timestamp;
+    timestamps t ON s.timestamp_id = t.id;
 
 CREATE VIEW UserThrottlePosition AS
 SELECT 
@@ -80,9 +70,7 @@ FROM
 JOIN 
     Throttle th ON u.id = th.User_Id
 JOIN 
-    timestamps t ON th.timestamp_id = t.id
-ORDER BY 
-    u.id, t.timestamp;
+    timestamps t ON th.timestamp_id = t.id;
 
 CREATE VIEW UserCoolantTemperature AS
 SELECT 
@@ -94,9 +82,7 @@ FROM
 JOIN 
     Coolant c ON u.id = c.User_Id
 JOIN 
-    timestamps t ON c.timestamp_id = t.id
-ORDER BY 
-    u.id, t.timestamp;
+    timestamps t ON c.timestamp_id = t.id;
 
 CREATE VIEW UserIntakeManifoldLevel AS
 SELECT 
@@ -108,9 +94,7 @@ FROM
 JOIN 
     Intake_manifold im ON u.id = im.User_Id
 JOIN 
-    timestamps t ON im.timestamp_id = t.id
-ORDER BY 
-    u.id, t.timestamp;
+    timestamps t ON im.timestamp_id = t.id;
 
 CREATE VIEW UserRPM AS
 SELECT 
@@ -122,9 +106,7 @@ FROM
 JOIN 
     RPM r ON u.id = r.User_Id
 JOIN 
-    timestamps t ON r.timestamp_id = t.id
-ORDER BY 
-    u.id, t.timestamp;
+    timestamps t ON r.timestamp_id = t.id;
 
 CREATE VIEW UserDiagnosticCodes AS
 SELECT 
@@ -136,9 +118,7 @@ FROM
 JOIN 
     DC dc ON u.id = dc.User_Id
 JOIN 
-    timestamps t ON dc.timestamp_id = t.id
-ORDER BY 
-    u.id, t.timestamp;
+    timestamps t ON dc.timestamp_id = t.id;
 
 CREATE VIEW UserVoltage AS
 SELECT 
@@ -150,6 +130,4 @@ FROM
 JOIN 
     voltage v ON u.id = v.User_Id
 JOIN 
-    timestamps t ON v.timestamp_id = t.id
-ORDER BY 
-    u.id, t.timestamp;
+    timestamps t ON v.timestamp_id = t.id;
@@ -0,0 +1,35 @@
+
+-- Makes timestamps.timestamp unique so DatabaseWriter can upsert it
+-- (INSERT ... ON CONFLICT) instead of SELECT-then-INSERT.
+-- Existing duplicates are merged into the row with the lowest id first.
+BEGIN;
+
+CREATE TEMP TABLE timestamp_duplicates ON COMMIT DROP AS
+SELECT
+    t.id AS duplicate_id,
+    k.keep_id
+FROM
+    timestamps t
+JOIN
+    (SELECT timestamp, min(id) AS keep_id FROM timestamps GROUP BY timestamp HAVING count(*) > 1) k
+    ON t.timestamp = k.timestamp
+WHERE
+    t.id <> k.keep_id;
+
+UPDATE Fuel_level SET timestamp_id = d.keep_id FROM timestamp_duplicates d WHERE timestamp_id = d.duplicate_id;
+UPDATE Fuel_cons SET timestamp_id = d.keep_id FROM timestamp_duplicates d WHERE timestamp_id = d.duplicate_id;
+UPDATE Mass_air_flow SET timestamp_id = d.keep_id FROM timestamp_duplicates d WHERE timestamp_id = d.duplicate_id;
+UPDATE Oxygen SET timestamp_id = d.keep_id FROM timestamp_duplicates d WHERE timestamp_id = d.duplicate_id;
+UPDATE Speed_kph SET timestamp_id = d.keep_id FROM timestamp_duplicates d WHERE timestamp_id = d.duplicate_id;
+UPDATE Throttle SET timestamp_id = d.keep_id FROM timestamp_duplicates d WHERE timestamp_id = d.duplicate_id;
+UPDATE Coolant SET timestamp_id = d.keep_id FROM timestamp_duplicates d WHERE timestamp_id = d.duplicate_id;
+UPDATE Intake_manifold SET timestamp_id = d.keep_id FROM timestamp_duplicates d WHERE timestamp_id = d.duplicate_id;
+UPDATE RPM SET timestamp_id = d.keep_id FROM timestamp_duplicates d WHERE timestamp_id = d.duplicate_id;
+UPDATE DC SET timestamp_id = d.keep_id FROM timestamp_duplicates d WHERE timestamp_id = d.duplicate_id;
+UPDATE voltage SET timestamp_id = d.keep_id FROM timestamp_duplicates d WHERE timestamp_id = d.duplicate_id;
+
+DELETE FROM timestamps WHERE id IN (SELECT duplicate_id FROM timestamp_duplicates);
+
+ALTER TABLE timestamps ADD CONSTRAINT timestamps_timestamp_key UNIQUE (timestamp);
+
+COMMIT;
@@ -0,0 +1,73 @@
+
+-- Backfills the wide telemetry table (database/telemetry.sql, create it first)
+-- from the per-metric tables. Safe to re-run, rows already present are kept.
+-- Requires 001_unique_timestamps.sql so every timestamp_id maps to one ts.
+BEGIN;
+
+INSERT INTO telemetry (
+    user_id, ts, speed, rpm, fuel_level, fuel_cons, mass_air_flow,
+    oxygen, throttle, coolant, intake_manifold, battery, diagnostic_codes
+)
+SELECT
+    k.User_Id,
+    t.timestamp,
+    s.speed,
+    r.rpm,
+    fl.fuel_level,
+    fc.fuel_cons,
+    maf.mass_air_flow,
+    o.oxygen,
+    th.throttle,
+    c.coolant,
+    im.intake_manifold,
+    v.battery,
+    dc.diagnostic_codes
+FROM
+    (
+        SELECT User_Id, timestamp_id FROM Fuel_level
+        UNION SELECT User_Id, timestamp_id FROM Fuel_cons
+        UNION SELECT User_Id, timestamp_id FROM Mass_air_flow
+        UNION SELECT User_Id, timestamp_id FROM Oxygen
+        UNION SELECT User_Id, timestamp_id FROM Speed_kph
+        UNION SELECT User_Id, timestamp_id FROM Throttle
+        UNION SELECT User_Id, timestamp_id FROM Coolant
+        UNION SELECT User_Id, timestamp_id FROM Intake_manifold
+        UNION SELECT User_Id, timestamp_id FROM RPM
+        UNION SELECT User_Id, timestamp_id FROM DC
+        UNION SELECT User_Id, timestamp_id FROM voltage
+    ) k
+JOIN
+    timestamps t ON k.timestamp_id = t.id
+LEFT JOIN
+    (SELECT User_Id, timestamp_id, avg(speed) AS speed FROM Speed_kph GROUP BY 1, 2) s USING (User_Id, timestamp_id)
+LEFT JOIN
+    (SELECT User_Id, timestamp_id, avg(amount) AS rpm FROM RPM GROUP BY 1, 2) r USING (User_Id, timestamp_id)
+LEFT JOIN
+    (SELECT User_Id, timestamp_id, avg(fuel) AS fuel_level FROM Fuel_level GROUP BY 1, 2) fl USING (User_Id, timestamp_id)
+LEFT JOIN
+    (SELECT User_Id, timestamp_id, avg(consumption) AS fuel_cons FROM Fuel_cons GROUP BY 1, 2) fc USING (User_Id, timestamp_id)
+LEFT JOIN
+    (SELECT User_Id, timestamp_id, avg(air_flow) AS mass_air_flow FROM Mass_air_flow GROUP BY 1, 2) maf USING (User_Id, timestamp_id)
+LEFT JOIN
+    (SELECT User_Id, timestamp_id, avg(oxygen_level) AS oxygen FROM Oxygen GROUP BY 1, 2) o USING (User_Id, timestamp_id)
+LEFT JOIN
+    (SELECT User_Id, timestamp_id, avg(position) AS throttle FROM Throttle GROUP BY 1, 2) th USING (User_Id, timestamp_id)
+LEFT JOIN
+    (SELECT User_Id, timestamp_id, avg(temp) AS coolant FROM Coolant GROUP BY 1, 2) c USING (User_Id, timestamp_id)
+LEFT JOIN
+    (SELECT User_Id, timestamp_id, avg(level) AS intake_manifold FROM Intake_manifold GROUP BY 1, 2) im USING (User_Id, timestamp_id)
+LEFT JOIN
+    -- voltage.volt is TEXT, anything that is not a plain number is dropped
+    (
+        SELECT User_Id, timestamp_id, avg(volt::float) AS battery
+        FROM voltage
+        WHERE volt ~ '^[-+]?[0-9]*\.?[0-9]+([eE][-+]?[0-9]+)?$'
+        GROUP BY 1, 2
+    ) v USING (User_Id, timestamp_id)
+LEFT JOIN
+    (SELECT User_Id, timestamp_id, array_agg(DISTINCT code) AS diagnostic_codes FROM DC GROUP BY 1, 2) dc USING (User_Id, timestamp_id)
+WHERE
+    k.User_Id IS NOT NULL
+ON CONFLICT (user_id, ts) DO NOTHING;
+
+COMMIT;
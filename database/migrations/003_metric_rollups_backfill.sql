@@ -0,0 +1,36 @@
+
+-- Builds metric_rollups (database/rollups.sql, create it first) from the
+-- per-metric tables. Run once before enabling rollups in DatabaseWriter, any
+-- rollups already present are replaced.
+BEGIN;
+
+DELETE FROM metric_rollups;
+
+INSERT INTO metric_rollups (user_id, metric, bucket_seconds, bucket, sum, count, min, max)
+SELECT
+    m.user_id,
+    m.metric,
+    b.seconds,
+    to_timestamp(floor(extract(epoch FROM m.timestamp) / b.seconds) * b.seconds) AT TIME ZONE 'UTC' AS bucket,
+    sum(m.value),
+    count(*),
+    min(m.value),
+    max(m.value)
+FROM
+    (
+        SELECT user_id, timestamp, 'speed' AS metric, speed AS value FROM UserSpeed
+        UNION ALL SELECT user_id, timestamp, 'fuel_level', fuel FROM UserFuelLevel
+        UNION ALL SELECT user_id, timestamp, 'fuel_cons', fuel_consumption FROM UserFuelConsumption
+        UNION ALL SELECT user_id, timestamp, 'mass_air_flow', air_flow FROM UserMassAirFlow
+        UNION ALL SELECT user_id, timestamp, 'oxygen', oxygen_level FROM UserOxygenLevel
+        UNION ALL SELECT user_id, timestamp, 'throttle', throttle_position FROM UserThrottlePosition
+        UNION ALL SELECT user_id, timestamp, 'coolant', coolant_temperature FROM UserCoolantTemperature
+        UNION ALL SELECT user_id, timestamp, 'intake_manifold', intake_manifold_level FROM UserIntakeManifoldLevel
+        UNION ALL SELECT user_id, timestamp, 'rpm', rpm FROM UserRPM
+    ) m
+CROSS JOIN
+    (VALUES (5), (30), (120), (1800), (7200)) AS b(seconds)
+GROUP BY
+    m.user_id, m.metric, b.seconds, bucket;
+
+COMMIT;
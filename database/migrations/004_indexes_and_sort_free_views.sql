@@ -0,0 +1,164 @@
+
+-- Indexes for the per-metric tables (see schema.sql) and the User* views
+-- without ORDER BY, so reads no longer sort or scan whole tables.
+-- Requires 001_unique_timestamps.sql, which indexes timestamps.timestamp.
+BEGIN;
+
+CREATE INDEX IF NOT EXISTS fuel_level_user_timestamp_idx ON Fuel_level (User_Id, timestamp_id);
+CREATE INDEX IF NOT EXISTS fuel_level_timestamp_idx ON Fuel_level (timestamp_id);
+CREATE INDEX IF NOT EXISTS fuel_cons_user_timestamp_idx ON Fuel_cons (User_Id, timestamp_id);
+CREATE INDEX IF NOT EXISTS fuel_cons_timestamp_idx ON Fuel_cons (timestamp_id);
+CREATE INDEX IF NOT EXISTS mass_air_flow_user_timestamp_idx ON Mass_air_flow (User_Id, timestamp_id);
+CREATE INDEX IF NOT EXISTS mass_air_flow_timestamp_idx ON Mass_air_flow (timestamp_id);
+CREATE INDEX IF NOT EXISTS oxygen_user_timestamp_idx ON Oxygen (User_Id, timestamp_id);
+CREATE INDEX IF NOT EXISTS oxygen_timestamp_idx ON Oxygen (timestamp_id);
+CREATE INDEX IF NOT EXISTS speed_kph_user_timestamp_idx ON Speed_kph (User_Id, timestamp_id);
+CREATE INDEX IF NOT EXISTS speed_kph_timestamp_idx ON Speed_kph (timestamp_id);
+CREATE INDEX IF NOT EXISTS throttle_user_timestamp_idx ON Throttle (User_Id, timestamp_id);
+CREATE INDEX IF NOT EXISTS throttle_timestamp_idx ON Throttle (timestamp_id);
+CREATE INDEX IF NOT EXISTS coolant_user_timestamp_idx ON Coolant (User_Id, timestamp_id);
+CREATE INDEX IF NOT EXISTS coolant_timestamp_idx ON Coolant (timestamp_id);
+CREATE INDEX IF NOT EXISTS intake_manifold_user_timestamp_idx ON Intake_manifold (User_Id, timestamp_id);
+CREATE INDEX IF NOT EXISTS intake_manifold_timestamp_idx ON Intake_manifold (timestamp_id);
+CREATE INDEX IF NOT EXISTS rpm_user_timestamp_idx ON RPM (User_Id, timestamp_id);
+CREATE INDEX IF NOT EXISTS rpm_timestamp_idx ON RPM (timestamp_id);
+CREATE INDEX IF NOT EXISTS dc_user_timestamp_idx ON DC (User_Id, timestamp_id);
+CREATE INDEX IF NOT EXISTS dc_timestamp_idx ON DC (timestamp_id);
+CREATE INDEX IF NOT EXISTS voltage_user_timestamp_idx ON voltage (User_Id, timestamp_id);
+CREATE INDEX IF NOT EXISTS voltage_timestamp_idx ON voltage (timestamp_id);
+
+-- Callers order the buckets they need, the views no longer force a sort
+CREATE OR REPLACE VIEW UserFuelLevel AS
+SELECT 
+    u.id AS user_id,
+    t.timestamp,
+    fl.fuel
+FROM 
+    Users u
+JOIN 
+    Fuel_level fl ON u.id = fl.User_Id
+JOIN 
+    timestamps t ON fl.timestamp_id = t.id;
+
+CREATE OR REPLACE VIEW UserFuelConsumption AS
+SELECT 
+    u.id AS user_id,
+    t.timestamp,
+    fc.consumption AS fuel_consumption
+FROM 
+    Users u
+JOIN 
+    Fuel_cons fc ON u.id = fc.User_Id
+JOIN 
+    timestamps t ON fc.timestamp_id = t.id;
+
+CREATE OR REPLACE VIEW UserMassAirFlow AS
+SELECT 
+    u.id AS user_id,
+    t.timestamp,
+    maf.air_flow
+FROM 
+    Users u
+JOIN 
+    Mass_air_flow maf ON u.id = maf.User_Id
+JOIN 
+    timestamps t ON maf.timestamp_id = t.id;
+
+CREATE OR REPLACE VIEW UserOxygenLevel AS
+SELECT 
+    u.id AS user_id,
+    t.timestamp,
+    o.oxygen_level
+FROM 
+    Users u
+JOIN 
+    Oxygen o ON u.id = o.User_Id
+JOIN 
+    timestamps t ON o.timestamp_id = t.id;
+
+
+CREATE OR REPLACE VIEW UserSpeed AS
+SELECT 
+    u.id AS user_id,
+    t.timestamp,
+    s.speed
+FROM 
+    Users u
+JOIN 
+    Speed_kph s ON u.id = s.User_Id
+JOIN 
+    timestamps t ON s.timestamp_id = t.id;
+
+CREATE OR REPLACE VIEW UserThrottlePosition AS
+SELECT 
+    u.id AS user_id,
+    t.timestamp,
+    th.position AS throttle_position
+FROM 
+    Users u
+JOIN 
+    Throttle th ON u.id = th.User_Id
+JOIN 
+    timestamps t ON th.timestamp_id = t.id;
+
+CREATE OR REPLACE VIEW UserCoolantTemperature AS
+SELECT 
+    u.id AS user_id,
+    t.timestamp,
+    c.temp AS coolant_temperature
+FROM 
+    Users u
+JOIN 
+    Coolant c ON u.id = c.User_Id
+JOIN 
+    timestamps t ON c.timestamp_id = t.id;
+
+CREATE OR REPLACE VIEW UserIntakeManifoldLevel AS
+SELECT 
+    u.id AS user_id,
+    t.timestamp,
+    im.level AS intake_manifold_level
+FROM 
+    Users u
+JOIN 
+    Intake_manifold im ON u.id = im.User_Id
+JOIN 
+    timestamps t ON im.timestamp_id = t.id;
+
+CREATE OR REPLACE VIEW UserRPM AS
+SELECT 
+    u.id AS user_id,
+    t.timestamp,
+    r.amount AS rpm
+FROM 
+    Users u
+JOIN 
+    RPM r ON u.id = r.User_Id
+JOIN 
+    timestamps t ON r.timestamp_id = t.id;
+
+CREATE OR REPLACE VIEW UserDiagnosticCodes AS
+SELECT 
+    u.id AS user_id,
+    t.timestamp,
+    dc.code AS diagnostic_code
+FROM 
+    Users u
+JOIN 
+    DC dc ON u.id = dc.User_Id
+JOIN 
+    timestamps t ON dc.timestamp_id = t.id;
+
+CREATE OR REPLACE VIEW UserVoltage AS
+SELECT 
+    u.id AS user_id,
+    t.timestamp,
+    v.volt AS voltage_value
+FROM 
+    Users u
+JOIN 
+    voltage v ON u.id = v.User_Id
+JOIN 
+    timestamps t ON v.timestamp_id = t.id;
+
+COMMIT;
@@ -0,0 +1,47 @@
+-- One row per user and timestamp in every per-metric table (per user,
+-- timestamp and code in DC), so DatabaseWriter can insert with ON CONFLICT
+-- DO NOTHING and a window written twice (a batch replayed from the spool
+-- after a crash, or a retried commit) is stored once.
+-- Existing duplicates are removed first, the row with the lowest id is kept.
+-- The unique indexes replace the plain (User_Id, timestamp_id) ones from
+-- 004_indexes_and_sort_free_views.sql.
+-- Rebuild metric_rollups afterwards (003_metric_rollups_backfill.sql) if rollups are enabled.
+BEGIN;
+
+DELETE FROM Fuel_level a USING Fuel_level b WHERE a.User_Id = b.User_Id AND a.timestamp_id = b.timestamp_id AND a.id > b.id;
+DELETE FROM Fuel_cons a USING Fuel_cons b WHERE a.User_Id = b.User_Id AND a.timestamp_id = b.timestamp_id AND a.id > b.id;
+DELETE FROM Mass_air_flow a USING Mass_air_flow b WHERE a.User_Id = b.User_Id AND a.timestamp_id = b.timestamp_id AND a.id > b.id;
+DELETE FROM Oxygen a USING Oxygen b WHERE a.User_Id = b.User_Id AND a.timestamp_id = b.timestamp_id AND a.id > b.id;
+DELETE FROM Speed_kph a USING Speed_kph b WHERE a.User_Id = b.User_Id AND a.timestamp_id = b.timestamp_id AND a.id > b.id;
+DELETE FROM Throttle a USING Throttle b WHERE a.User_Id = b.User_Id AND a.timestamp_id = b.timestamp_id AND a.id > b.id;
+DELETE FROM Coolant a USING Coolant b WHERE a.User_Id = b.User_Id AND a.timestamp_id = b.timestamp_id AND a.id > b.id;
+DELETE FROM Intake_manifold a USING Intake_manifold b WHERE a.User_Id = b.User_Id AND a.timestamp_id = b.timestamp_id AND a.id > b.id;
+DELETE FROM RPM a USING RPM b WHERE a.User_Id = b.User_Id AND a.timestamp_id = b.timestamp_id AND a.id > b.id;
+DELETE FROM voltage a USING voltage b WHERE a.User_Id = b.User_Id AND a.timestamp_id = b.timestamp_id AND a.id > b.id;
+DELETE FROM DC a USING DC b WHERE a.User_Id = b.User_Id AND a.timestamp_id = b.timestamp_id AND a.code = b.code AND a.id > b.id;
+
+DROP INDEX IF EXISTS fuel_level_user_timestamp_idx;
+DROP INDEX IF EXISTS fuel_cons_user_timestamp_idx;
+DROP INDEX IF EXISTS mass_air_flow_user_timestamp_idx;
+DROP INDEX IF EXISTS oxygen_user_timestamp_idx;
+DROP INDEX IF EXISTS speed_kph_user_timestamp_idx;
+DROP INDEX IF EXISTS throttle_user_timestamp_idx;
+DROP INDEX IF EXISTS coolant_user_timestamp_idx;
+DROP INDEX IF EXISTS intake_manifold_user_timestamp_idx;
+DROP INDEX IF EXISTS rpm_user_timestamp_idx;
+DROP INDEX IF EXISTS voltage_user_timestamp_idx;
+DROP INDEX IF EXISTS dc_user_timestamp_idx;
+
+CREATE UNIQUE INDEX fuel_level_user_timestamp_idx ON Fuel_level (User_Id, timestamp_id);
+CREATE UNIQUE INDEX fuel_cons_user_timestamp_idx ON Fuel_cons (User_Id, timestamp_id);
+CREATE UNIQUE INDEX mass_air_flow_user_timestamp_idx ON Mass_air_flow (User_Id, timestamp_id);
+CREATE UNIQUE INDEX oxygen_user_timestamp_idx ON Oxygen (User_Id, timestamp_id);
+CREATE UNIQUE INDEX speed_kph_user_timestamp_idx ON Speed_kph (User_Id, timestamp_id);
+CREATE UNIQUE INDEX throttle_user_timestamp_idx ON Throttle (User_Id, timestamp_id);
+CREATE UNIQUE INDEX coolant_user_timestamp_idx ON Coolant (User_Id, timestamp_id);
+CREATE UNIQUE INDEX intake_manifold_user_timestamp_idx ON Intake_manifold (User_Id, timestamp_id);
+CREATE UNIQUE INDEX rpm_user_timestamp_idx ON RPM (User_Id, timestamp_id);
+CREATE UNIQUE INDEX voltage_user_timestamp_idx ON voltage (User_Id, timestamp_id);
+CREATE UNIQUE INDEX dc_user_timestamp_code_idx ON DC (User_Id, timestamp_id, code);
+
+COMMIT;
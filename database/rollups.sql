@@ -0,0 +1,16 @@
+
+-- Per-bucket aggregates for the dashboard intervals (5s, 30s, 2min, 30min,
+-- 2hours), keyed by bucket width in seconds. Maintained incrementally by
+-- DatabaseWriter(rollups=True) and read by DataAccess(use_rollups=True).
+-- Metric names are the data window keys (speed, rpm, mass_air_flow, ...).
+CREATE TABLE metric_rollups (
+    user_id INT NOT NULL REFERENCES Users(id),
+    metric TEXT NOT NULL,
+    bucket_seconds INT NOT NULL,
+    bucket TIMESTAMP NOT NULL,
+    sum FLOAT NOT NULL,
+    count INT NOT NULL,
+    min FLOAT NOT NULL,
+    max FLOAT NOT NULL,
+    PRIMARY KEY (user_id, metric, bucket_seconds, bucket)
+);
@@ -5,7 +5,7 @@ CREATE TABLE Users (
 
 CREATE TABLE timestamps (
     id SERIAL PRIMARY KEY,
-    timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    timestamp TIMESTAMP UNIQUE DEFAULT CURRENT_TIMESTAMP
 );
 
 CREATE TABLE Fuel_level (
@@ -84,3 +84,30 @@ CREATE TABLE voltage (
     volt TEXT NOT NULL,
     timestamp_id INT REFERENCES timestamps(id)
 );
+
+-- Per-user reads walk (User_Id, timestamp_id), range reads and
+-- delete_old_data() find rows by timestamp_id. A user has one row per
+-- timestamp in each metric table (and per code in DC), so a window written
+-- twice is stored once.
+CREATE UNIQUE INDEX fuel_level_user_timestamp_idx ON Fuel_level (User_Id, timestamp_id);
+CREATE INDEX fuel_level_timestamp_idx ON Fuel_level (timestamp_id);
+CREATE UNIQUE INDEX fuel_cons_user_timestamp_idx ON Fuel_cons (User_Id, timestamp_id);
+CREATE INDEX fuel_cons_timestamp_idx ON Fuel_cons (timestamp_id);
+CREATE UNIQUE INDEX mass_air_flow_user_timestamp_idx ON Mass_air_flow (User_Id, timestamp_id);
+CREATE INDEX mass_air_flow_timestamp_idx ON Mass_air_flow (timestamp_id);
+CREATE UNIQUE INDEX oxygen_user_timestamp_idx ON Oxygen (User_Id, timestamp_id);
+CREATE INDEX oxygen_timestamp_idx ON Oxygen (timestamp_id);
+CREATE UNIQUE INDEX speed_kph_user_timestamp_idx ON Speed_kph (User_Id, timestamp_id);
+CREATE INDEX speed_kph_timestamp_idx ON Speed_kph (timestamp_id);
+CREATE UNIQUE INDEX throttle_user_timestamp_idx ON Throttle (User_Id, timestamp_id);
+CREATE INDEX throttle_timestamp_idx ON Throttle (timestamp_id);
+CREATE UNIQUE INDEX coolant_user_timestamp_idx ON Coolant (User_Id, timestamp_id);
+CREATE INDEX coolant_timestamp_idx ON Coolant (timestamp_id);
+CREATE UNIQUE INDEX intake_manifold_user_timestamp_idx ON Intake_manifold (User_Id, timestamp_id);
+CREATE INDEX intake_manifold_timestamp_idx ON Intake_manifold (timestamp_id);
+CREATE UNIQUE INDEX rpm_user_timestamp_idx ON RPM (User_Id, timestamp_id);
+CREATE INDEX rpm_timestamp_idx ON RPM (timestamp_id);
+CREATE UNIQUE INDEX dc_user_timestamp_code_idx ON DC (User_Id, timestamp_id, code);
+CREATE INDEX dc_timestamp_idx ON DC (timestamp_id);
+CREATE UNIQUE INDEX voltage_user_timestamp_idx ON voltage (User_Id, timestamp_id);
+CREATE INDEX voltage_timestamp_idx ON voltage (timestamp_id);
@@ -0,0 +1,20 @@
+
+-- Optional wide layout: one row per user and sample window instead of one
+-- row per metric spread over the Fuel_level, RPM, Speed_kph, ... tables.
+-- Used when DatabaseWriter/DataAccess are created with storage='wide'.
+CREATE TABLE telemetry (
+    user_id INT NOT NULL REFERENCES Users(id),
+    ts TIMESTAMP NOT NULL,
+    speed FLOAT,
+    rpm FLOAT,
+    fuel_level FLOAT,
+    fuel_cons FLOAT,
+    mass_air_flow FLOAT,
+    oxygen FLOAT,
+    throttle FLOAT,
+    coolant FLOAT,
+    intake_manifold FLOAT,
+    battery FLOAT,
+    diagnostic_codes TEXT[],
+    PRIMARY KEY (user_id, ts)
+);
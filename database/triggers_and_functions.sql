@@ -6,19 +6,27 @@ DECLARE
     cutoff_date DATE;
     max_date_in_table DATE;
     start_of_month DATE;
+    -- Optional tables, see telemetry.sql and rollups.sql
+    has_telemetry BOOLEAN := to_regclass('telemetry') IS NOT NULL;
+    has_rollups BOOLEAN := to_regclass('metric_rollups') IS NOT NULL;
 BEGIN
     -- Calculate the cutoff date, 3 months ago from today
     cutoff_date := date_trunc('month', current_date) - interval '3 months';
 
     -- Find the maximum date in the timestamps table
     SELECT max(timestamp)::date INTO max_date_in_table FROM timestamps;
+    IF has_telemetry THEN
+        -- With the wide layout the samples are only in telemetry
+        SELECT greatest(max_date_in_table, max(ts)::date) INTO max_date_in_table FROM telemetry;
+    END IF;
 
     -- Loop through each month and delete data if the entire month is older than 3 months
-    FOR start_of_month IN
-        SELECT date_trunc('month', timestamp)::date
-        FROM timestamps
-        WHERE timestamp < cutoff_date
-        GROUP BY date_trunc('month', timestamp)::date
+    FOR start_of_month IN EXECUTE
+        'SELECT date_trunc(''month'', timestamp)::date FROM timestamps WHERE timestamp < $1'
+        || CASE WHEN has_telemetry
+                THEN ' UNION SELECT date_trunc(''month'', ts)::date FROM telemetry WHERE ts < $1'
+                ELSE '' END
+        USING cutoff_date
     LOOP
         -- Ensure the month is fully older than 3 months
         IF start_of_month < cutoff_date AND max_date_in_table < (start_of_month + interval '1 month') THEN
@@ -47,6 +55,13 @@ BEGIN
             DELETE FROM RPM WHERE timestamp_id IN (
                 SELECT id FROM timestamps WHERE timestamp >= start_of_month AND timestamp < start_of_month + interval '1 month'
             );
+            IF has_telemetry THEN
+                DELETE FROM telemetry WHERE ts >= start_of_month AND ts < start_of_month + interval '1 month';
+            END IF;
+            IF has_rollups THEN
+                -- Bucket widths divide a day, so no bucket spans two months
+                DELETE FROM metric_rollups WHERE bucket >= start_of_month AND bucket < start_of_month + interval '1 month';
+            END IF;
 
             -- Finally, delete from the timestamps table
             DELETE FROM timestamps WHERE timestamp >= start_of_month AND timestamp < start_of_month + interval '1 month';
@@ -1,10 +1,53 @@
 import logging
 from typing import Dict, List, Any, Optional, Union
+from buffer.history import History
 
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
-class Buffer:
+class ChannelStats:
+    # Running aggregates of one channel, mean and variance use Welford's algorithm
+    __slots__ = ('count', 'total', 'minimum', 'maximum', 'last', 'mean', 'm2')
+
     def __init__(self) -> None:
+        self.reset()
+
+    def reset(self) -> None:
+        self.count = 0
+        self.total = 0.0
+        self.minimum: Optional[Union[float, int]] = None
+        self.maximum: Optional[Union[float, int]] = None
+        self.last: Optional[Any] = None
+        self.mean = 0.0
+        self.m2 = 0.0
+
+    def add(self, value: Union[float, int]) -> None:
+        self.count += 1
+        self.total += value
+        if self.minimum is None or value < self.minimum:
+            self.minimum = value
+        if self.maximum is None or value > self.maximum:
+            self.maximum = value
+        self.last = value
+        delta = value - self.mean
+        self.mean += delta / self.count
+        self.m2 += delta * (value - self.mean)
+
+    def variance(self) -> Optional[float]:
+        # Sample variance, needs at least two values
+        if self.count < 2:
+            return None
+        return self.m2 / (self.count - 1)
+
+class Buffer:
+    def __init__(self, streaming: bool = False, history_size: int = 0) -> None:
+        # In streaming mode only running aggregates are kept, so memory does
+        # not grow with the window length or the sample rate
+        self.streaming = streaming
+        self.history: Optional[History] = None
+        self.stats: Dict[str, ChannelStats] = {}
+        # Diagnostic codes seen in the window, a dict is used as an insertion-ordered set
+        self.codes: Dict[str, None] = {}
+
         # Initialize a dictionary with empty lists for each data type
         self.data: Dict[str, List[Any]] = {
             'fuel_level': [],
@@ -20,10 +63,26 @@ class Buffer:
             'diagnostic_codes': []
         }
 
+        if self.streaming:
+            self.stats = {key: ChannelStats() for key in self.data if key != 'diagnostic_codes'}
+
+        # The last history_size samples of each channel survive clear_buffer()
+        if history_size > 0:
+            self.history = History((key for key in self.data if key != 'diagnostic_codes'), history_size)
+
     def get_all_data(self):
+        if self.streaming:
+            return {**self.stats, 'diagnostic_codes': list(self.codes)}
         return self.data
 
-    def update_buffer(self, data: Dict[str, Any]) -> None:
+    def update_buffer(self, data: Dict[str, Any], timestamp: Optional[float] = None) -> None:
+        if self.history is not None:
+            self.history.update(data, timestamp)
+
+        if self.streaming:
+            self._update_stats(data)
+            return
+
         # Iterate over the data dictionary and append values to the corresponding lists
         for key, value in data.items():
             if key in self.data:
@@ -31,25 +90,57 @@ class Buffer:
                     self.data[key].append(value)
                 elif key == 'diagnostic_codes' and isinstance(value, list) and all(isinstance(i, str) for i in value):
                     for v in value:
-                        if v not in self.data[key]:
+                        if v not in self.codes:
+                            self.codes[v] = None
                             self.data[key].append(v)
                 else:
                     logging.warning(f"Invalid value type for {key}: {type(value)}. Expected int, float, str, or list of strings.")
             else:
                 logging.warning(f"{key} is not a recognized data type and will be ignored.")
 
+    def _update_stats(self, data: Dict[str, Any]) -> None:
+        for key, value in data.items():
+            stats = self.stats.get(key)
+            if stats is not None:
+                if isinstance(value, (int, float)):
+                    stats.add(value)
+                elif isinstance(value, str):
+                    stats.last = value
+                else:
+                    logging.warning(f"Invalid value type for {key}: {type(value)}. Expected int, float, str, or list of strings.")
+            elif key == 'diagnostic_codes':
+                if isinstance(value, list) and all(isinstance(i, str) for i in value):
+                    self.codes.update(dict.fromkeys(value))
+                else:
+                    logging.warning(f"Invalid value type for {key}: {type(value)}. Expected int, float, str, or list of strings.")
+            else:
+                logging.warning(f"{key} is not a recognized data type and will be ignored.")
+
     def get_latest_data(self) -> Dict[str, Optional[Any]]:
         latest_data: Dict[str, Optional[Any]] = {}
+        if self.streaming:
+            for key, stats in self.stats.items():
+                latest_data[key] = stats.last
+            latest_data['diagnostic_codes'] = next(reversed(self.codes)) if self.codes else None
+            return latest_data
+
         for key, values in self.data.items():
             if values:  # If there are values in the list
                 latest_data[key] = values[-1]  # Get the most recent value
             else:
-                logging.info(f"No data available for {key}.")
+                # Called for every live snapshot, too often for INFO
+                logging.debug(f"No data available for {key}.")
                 latest_data[key] = None
         return latest_data
 
     def get_minimum_values(self) -> Dict[str, Optional[Union[float, int]]]:
         min_values: Dict[str, Optional[Union[float, int]]] = {}
+        if self.streaming:
+            for key, stats in self.stats.items():
+                min_values[key] = stats.minimum
+            min_values['diagnostic_codes'] = None
+            return min_values
+
         for key, values in self.data.items():
             if values and isinstance(values[0], (int, float)):
                 min_values[key] = min(values)
@@ -60,6 +151,12 @@ class Buffer:
 
     def get_maximum_values(self) -> Dict[str, Optional[Union[float, int]]]:
         max_values: Dict[str, Optional[Union[float, int]]] = {}
+        if self.streaming:
+            for key, stats in self.stats.items():
+                max_values[key] = stats.maximum
+            max_values['diagnostic_codes'] = None
+            return max_values
+
         for key, values in self.data.items():
             if values and isinstance(values[0], (int, float)):
                 max_values[key] = max(values)
@@ -71,6 +168,12 @@ class Buffer:
     def give_average_of_data(self) -> Dict[str, Optional[float]]:
         # Calculate and return the average of each numeric data type
         averages: Dict[str, Optional[float]] = {}
+        if self.streaming:
+            for key, stats in self.stats.items():
+                averages[key] = stats.total / stats.count if stats.count else None
+            averages['diagnostic_codes'] = None
+            return averages
+
         for key, values in self.data.items():
             if values and isinstance(values[0], (int, float)):  # Ensure that the values list contains numeric data
                 averages[key] = sum(values) / len(values)
@@ -78,15 +181,43 @@ class Buffer:
                 averages[key] = None
         return averages
 
+    def get_sample_counts(self) -> Dict[str, int]:
+        # Number of numeric samples behind each average, for weighting merged windows
+        if self.streaming:
+            return {key: stats.count for key, stats in self.stats.items()}
+        return {
+            key: len(values) for key, values in self.data.items()
+            if values and isinstance(values[0], (int, float))
+        }
+
+    def get_variance_values(self) -> Dict[str, Optional[float]]:
+        variances: Dict[str, Optional[float]] = {}
+        if self.streaming:
+            for key, stats in self.stats.items():
+                variances[key] = stats.variance()
+            return variances
+
+        for key, values in self.data.items():
+            if len(values) > 1 and isinstance(values[0], (int, float)):
+                mean = sum(values) / len(values)
+                variances[key] = sum((v - mean) ** 2 for v in values) / (len(values) - 1)
+            elif key != 'diagnostic_codes':
+                variances[key] = None
+        return variances
+
     def get_diagnostic_codes(self) -> List[str]:
-        if self.data['diagnostic_codes']:
+        if self.streaming and self.codes:
+            return list(self.codes)
+        if not self.streaming and self.data['diagnostic_codes']:
             return self.data['diagnostic_codes']
-        else:
-            logging.info("No diagnostic codes available.")
-            return None
+        logging.info("No diagnostic codes available.")
+        return None
 
     def clear_buffer(self) -> None:
         # Clear all the lists in the data dictionary
         for key in self.data:
             self.data[key].clear()
+        for stats in self.stats.values():
+            stats.reset()
+        self.codes.clear()
         logging.info("Buffer cleared.")
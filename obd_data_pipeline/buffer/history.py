@@ -0,0 +1,100 @@
+import time
+import numpy as np
+from typing import Dict, Any, Iterable, Optional, Tuple
+
+
+class ChannelHistory:
+    # Fixed-size ring of (timestamp, value) pairs, appends never allocate
+    def __init__(self, capacity: int) -> None:
+        if capacity < 1:
+            raise ValueError("History capacity must be at least 1")
+        self.capacity = capacity
+        self.timestamps = np.zeros(capacity, dtype=np.float64)
+        self.values = np.zeros(capacity, dtype=np.float64)
+        self.head = 0  # index the next sample is written to
+        self.count = 0
+
+    def append(self, timestamp: float, value: float) -> None:
+        self.timestamps[self.head] = timestamp
+        self.values[self.head] = value
+        self.head = (self.head + 1) % self.capacity
+        if self.count < self.capacity:
+            self.count += 1
+
+    def clear(self) -> None:
+        self.head = 0
+        self.count = 0
+
+    def __len__(self) -> int:
+        return self.count
+
+    def window(self, k: Optional[int] = None, seconds: Optional[float] = None,
+               now: Optional[float] = None) -> Tuple[np.ndarray, np.ndarray]:
+        # Oldest-first timestamps and values of the last k samples and/or the last `seconds`
+        n = self.count if k is None else min(k, self.count)
+        start = (self.head - n) % self.capacity
+        if start + n <= self.capacity:
+            # Contiguous, return views without copying
+            timestamps = self.timestamps[start:start + n]
+            values = self.values[start:start + n]
+        else:
+            timestamps = np.concatenate((self.timestamps[start:], self.timestamps[:self.head]))
+            values = np.concatenate((self.values[start:], self.values[:self.head]))
+
+        if seconds is not None and n:
+            cutoff = (time.time() if now is None else now) - seconds
+            first = np.searchsorted(timestamps, cutoff, side='left')
+            timestamps = timestamps[first:]
+            values = values[first:]
+        return timestamps, values
+
+    def mean(self, k: Optional[int] = None, seconds: Optional[float] = None) -> Optional[float]:
+        _, values = self.window(k, seconds)
+        return float(values.mean()) if values.size else None
+
+    def percentile(self, q: float, k: Optional[int] = None, seconds: Optional[float] = None) -> Optional[float]:
+        _, values = self.window(k, seconds)
+        return float(np.percentile(values, q)) if values.size else None
+
+    def slope(self, k: Optional[int] = None, seconds: Optional[float] = None) -> Optional[float]:
+        # Least-squares trend in units per second
+        timestamps, values = self.window(k, seconds)
+        if values.size < 2:
+            return None
+        t = timestamps - timestamps.mean()
+        denominator = np.dot(t, t)
+        if denominator == 0:
+            return None
+        return float(np.dot(t, values - values.mean()) / denominator)
+
+    def rolling_min(self, size: int, k: Optional[int] = None, seconds: Optional[float] = None) -> np.ndarray:
+        if size < 1:
+            raise ValueError(f"Rolling window size must be at least 1, got {size}")
+        _, values = self.window(k, seconds)
+        if values.size < size:
+            return np.empty(0, dtype=np.float64)
+        return np.lib.stride_tricks.sliding_window_view(values, size).min(axis=1)
+
+    def rolling_max(self, size: int, k: Optional[int] = None, seconds: Optional[float] = None) -> np.ndarray:
+        if size < 1:
+            raise ValueError(f"Rolling window size must be at least 1, got {size}")
+        _, values = self.window(k, seconds)
+        if values.size < size:
+            return np.empty(0, dtype=np.float64)
+        return np.lib.stride_tricks.sliding_window_view(values, size).max(axis=1)
+
+
+class History:
+    # Per-channel ring buffers that outlive the Buffer flush window
+    def __init__(self, channels: Iterable[str], capacity: int) -> None:
+        self.channels: Dict[str, ChannelHistory] = {name: ChannelHistory(capacity) for name in channels}
+
+    def update(self, data: Dict[str, Any], timestamp: Optional[float] = None) -> None:
+        timestamp = time.time() if timestamp is None else timestamp
+        for key, value in data.items():
+            channel = self.channels.get(key)
+            if channel is not None and isinstance(value, (int, float)):
+                channel.append(timestamp, value)
+
+    def __getitem__(self, name: str) -> ChannelHistory:
+        return self.channels[name]
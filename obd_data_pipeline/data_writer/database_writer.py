@@ -1,145 +1,387 @@
 import psycopg2
+import psycopg2.extras
 import logging
-from typing import Dict, Any
+import time
+from datetime import datetime, timedelta
+from typing import Dict, Any, Optional, List, Tuple
+
+# Key in a data window -> (metric table, value column)
+METRIC_TABLES = {
+    'fuel_level': ('Fuel_level', 'fuel'),
+    'fuel_cons': ('Fuel_cons', 'consumption'),
+    'rpm': ('RPM', 'amount'),
+    'coolant': ('Coolant', 'temp'),
+    'intake_manifold': ('Intake_manifold', 'level'),
+    'mass_air_flow': ('Mass_air_flow', 'air_flow'),
+    'oxygen': ('Oxygen', 'oxygen_level'),
+    'speed': ('Speed_kph', 'speed'),
+    'throttle': ('Throttle', 'position'),
+    'diagnostic_codes': ('DC', 'code'),
+    'battery': ('voltage', 'volt'),
+}
+
+# Columns of the unique index each per-metric table's inserts conflict on
+# (database/migrations/005_unique_metric_rows.sql), a DC row per code
+METRIC_UNIQUE_COLUMNS = {key: 'User_Id, timestamp_id' for key in METRIC_TABLES}
+METRIC_UNIQUE_COLUMNS['diagnostic_codes'] = 'User_Id, timestamp_id, code'
+
+# Columns of the wide telemetry table, named after the keys of a data window
+TELEMETRY_COLUMNS = (
+    'speed', 'rpm', 'fuel_level', 'fuel_cons', 'mass_air_flow', 'oxygen',
+    'throttle', 'coolant', 'intake_manifold', 'battery', 'diagnostic_codes',
+)
+
+# Storage layouts: one table per metric (schema.sql) or one telemetry row per window (telemetry.sql)
+STORAGE_LAYOUTS = ('narrow', 'wide')
+
+# Metrics rolled up into metric_rollups (database/rollups.sql), by data window key
+ROLLUP_METRICS = (
+    'speed', 'rpm', 'fuel_level', 'fuel_cons', 'mass_air_flow', 'oxygen',
+    'throttle', 'coolant', 'intake_manifold',
+)
+
+# Bucket widths in seconds of the dashboard intervals 5s, 30s, 2min, 30min and 2hours
+ROLLUP_INTERVALS = (5, 30, 120, 1800, 7200)
+
+EPOCH = datetime(1970, 1, 1)
+
+# Rows sent per multi-row INSERT statement by insert_batch
+BATCH_PAGE_SIZE = 1000
+
+# Channel a '<user id> <earliest epoch second>' notification is sent on with
+# every committed write, so readers can drop what they cached for that range
+WRITE_CHANNEL = 'metric_writes'
+
+# An idle connection is checked with SELECT 1 before reuse after this many seconds
+HEALTH_CHECK_INTERVAL = 30.0
 
 class DatabaseWriter:
-    def __init__(self, dbname: str, user: str, userid: int) -> None:
+    def __init__(self, dbname: str, user: str, userid: int, max_retries: int = 5,
+                 backoff: float = 0.5, max_backoff: float = 30.0, storage: str = 'narrow',
+                 rollups: bool = False) -> None:
+        if storage not in STORAGE_LAYOUTS:
+            raise ValueError(f"Unknown storage layout: {storage}")
         self.dbname = dbname
         self.user = user
         self.userid = userid
+        self.storage = storage
+        self.rollups = rollups
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.connection = None
+        self.last_used = 0.0
+
+    def connect(self):
+        # Retries with exponential backoff, the database may still be starting after boot
+        delay = self.backoff
+        for attempt in range(1, self.max_retries + 1):
+            try:
+                self.connection = psycopg2.connect(dbname=self.dbname, user=self.user)
+                self._prepare_statements()
+                self.last_used = time.monotonic()
+                logging.info("Database connection established.")
+                return self.connection
+            except psycopg2.OperationalError as e:
+                self._discard_connection()
+                if attempt == self.max_retries:
+                    logging.error(f"Could not connect to the database after {attempt} attempts: {e}")
+                    raise
+                logging.warning(f"Database connection failed ({e}), retrying in {delay:.1f}s.")
+                time.sleep(delay)
+                delay = min(delay * 2, self.max_backoff)
+
+    def close(self) -> None:
+        if self.connection:
+            try:
+                self.connection.close()
+                logging.info("Database connection closed.")
+            except psycopg2.Error as e:
+                logging.error(f"Error closing connection: {e}")
+            finally:
+                self.connection = None
+
+    def _discard_connection(self) -> None:
+        if self.connection:
+            try:
+                self.connection.close()
+            except psycopg2.Error:
+                pass
+            self.connection = None
+
+    def _get_connection(self):
+        if self.connection is None or self.connection.closed:
+            return self.connect()
+
+        if time.monotonic() - self.last_used > HEALTH_CHECK_INTERVAL:
+            try:
+                with self.connection.cursor() as cursor:
+                    cursor.execute("SELECT 1;")
+                self.connection.rollback()
+            except (psycopg2.OperationalError, psycopg2.InterfaceError) as e:
+                logging.warning(f"Database connection is stale ({e}), reconnecting.")
+                self._discard_connection()
+                return self.connect()
+
+        return self.connection
+
+    def _prepare_statements(self) -> None:
+        # Server-side prepared statements live as long as the connection,
+        # so every flush only sends EXECUTE with the values
+        if self.storage == 'wide':
+            return
+        with self.connection.cursor() as cursor:
+            cursor.execute("""
+                PREPARE upsert_timestamp AS
+                INSERT INTO timestamps (timestamp) VALUES ($1)
+                ON CONFLICT (timestamp) DO UPDATE SET timestamp = EXCLUDED.timestamp
+                RETURNING id;
+            """)
+            for key, (table, column) in METRIC_TABLES.items():
+                cursor.execute(f"""
+                    PREPARE insert_{key} AS
+                    INSERT INTO {table} (User_Id, {column}, timestamp_id)
+                    VALUES ($1, $2, $3)
+                    ON CONFLICT ({METRIC_UNIQUE_COLUMNS[key]}) DO NOTHING;
+                """)
+        self.connection.commit()
+
+    def _with_reconnect(self, write, *args) -> None:
+        try:
+            write(*args)
+        except (psycopg2.OperationalError, psycopg2.InterfaceError) as e:
+            # The connection dropped mid-write, retry once. The commit may have
+            # landed before the reply was lost, the inserts are idempotent.
+            logging.warning(f"Database connection lost ({e}), reconnecting.")
+            self._discard_connection()
+            write(*args)
 
     def insert_new_data(self, timestamp, data: Dict[str, Any]) -> None:
+        if self.storage == 'wide':
+            self._with_reconnect(self._write_telemetry, [(timestamp, data)])
+        else:
+            self._with_reconnect(self._write_window, timestamp, data)
+
+    def insert_batch(self, windows: List[Tuple[datetime, Dict[str, Any]]]) -> None:
+        # Writes any number of windows in one transaction with one multi-row
+        # statement per table, used to catch up after the database was unavailable
+        if not windows:
+            return
+        if self.storage == 'wide':
+            self._with_reconnect(self._write_telemetry, windows)
+        else:
+            self._with_reconnect(self._write_batch, windows)
+
+    def _write_telemetry(self, windows: List[Tuple[datetime, Dict[str, Any]]]) -> None:
         connection = None
         cursor = None
         try:
-            connection = psycopg2.connect(dbname=self.dbname, user=self.user)
+            connection = self._get_connection()
             cursor = connection.cursor()
-            logging.info("Database connection established.")
-
-            timestamp_str = timestamp.strftime('%Y-%m-%d %H:%M:%S')
 
-            # Check if the timestamp already exists in the database
-            cursor.execute("""
-                SELECT id FROM timestamps WHERE timestamp = %s;
-            """, (timestamp_str,))
-            result = cursor.fetchone()
+            # One row per window, windows sharing a timestamp are merged since
+            # a single upsert statement may not touch the same row twice
+            rows: Dict[str, Dict[str, Any]] = {}
+            for timestamp, data in windows:
+                row = rows.setdefault(timestamp.strftime('%Y-%m-%d %H:%M:%S'), {})
+                for column in TELEMETRY_COLUMNS:
+                    if data.get(column) is not None:
+                        row[column] = data[column]
 
-            if result:
-                timestamp_id = result[0]
-            else:
-                cursor.execute("""
-                    INSERT INTO timestamps (timestamp) VALUES (%s) RETURNING id;
-                """, (timestamp_str,))
-                timestamp_id = cursor.fetchone()[0]
+            columns = ', '.join(TELEMETRY_COLUMNS)
+            updates = ', '.join(f"{column} = COALESCE(EXCLUDED.{column}, telemetry.{column})" for column in TELEMETRY_COLUMNS)
+            psycopg2.extras.execute_values(cursor, f"""
+                INSERT INTO telemetry (user_id, ts, {columns}) VALUES %s
+                ON CONFLICT (user_id, ts) DO UPDATE SET {updates};
+            """, [
+                (self.userid, timestamp_str) + tuple(row.get(column) for column in TELEMETRY_COLUMNS)
+                for timestamp_str, row in rows.items()
+            ], page_size=BATCH_PAGE_SIZE)
 
-            # Insert data into the respective tables
-            self._insert_fuel_level(cursor, timestamp_id, data.get('fuel_level'))
-            self._insert_fuel_cons(cursor, timestamp_id, data.get('fuel_cons'))
-            self._insert_rpm(cursor, timestamp_id, data.get('rpm'))
-            self._insert_coolant(cursor, timestamp_id, data.get('coolant'))
-            self._insert_intake_manifold(cursor, timestamp_id, data.get('intake_manifold'))
-            self._insert_mass_air_flow(cursor, timestamp_id, data.get('mass_air_flow'))
-            self._insert_oxygen(cursor, timestamp_id, data.get('oxygen'))
-            self._insert_speed(cursor, timestamp_id, data.get('speed'))
-            self._insert_throttle(cursor, timestamp_id, data.get('throttle'))
-            self._insert_diagnostic_codes(cursor, timestamp_id, data.get('diagnostic_codes'))
-            self._insert_voltage(cursor, timestamp_id, data.get('battery'))
+            if self.rollups:
+                self._update_rollups(cursor, windows)
 
+            self._notify_write(cursor, windows)
             connection.commit()
-            logging.info(f"Data committed to the database at {timestamp_str}.")
+            self.last_used = time.monotonic()
+            logging.info(f"{len(rows)} telemetry rows committed to the database up to {max(rows)}.")
 
         except psycopg2.DatabaseError as e:
             logging.error(f"Database error occurred: {e}")
-            if connection:
+            if connection and not connection.closed:
                 connection.rollback()
             raise
-        except Exception as e:
-            logging.error(f"Failed to insert data: {e}")
-            if connection:
+        finally:
+            if cursor and not cursor.closed:
+                cursor.close()
+
+    def _write_batch(self, windows: List[Tuple[datetime, Dict[str, Any]]]) -> None:
+        connection = None
+        cursor = None
+        try:
+            connection = self._get_connection()
+            cursor = connection.cursor()
+
+            timestamps = sorted({timestamp.strftime('%Y-%m-%d %H:%M:%S') for timestamp, _ in windows})
+            rows = psycopg2.extras.execute_values(cursor, """
+                INSERT INTO timestamps (timestamp) VALUES %s
+                ON CONFLICT (timestamp) DO UPDATE SET timestamp = EXCLUDED.timestamp
+                RETURNING id, timestamp;
+            """, [(timestamp,) for timestamp in timestamps], page_size=BATCH_PAGE_SIZE, fetch=True)
+            timestamp_ids = {timestamp.strftime('%Y-%m-%d %H:%M:%S'): timestamp_id for timestamp_id, timestamp in rows}
+
+            for key, (table, column) in METRIC_TABLES.items():
+                values = []
+                for timestamp, data in windows:
+                    timestamp_id = timestamp_ids[timestamp.strftime('%Y-%m-%d %H:%M:%S')]
+                    value = data.get(key)
+                    if key == 'diagnostic_codes':
+                        values.extend((self.userid, code, timestamp_id) for code in value or [])
+                    elif value is not None:
+                        values.append((self.userid, value, timestamp_id))
+                if values:
+                    # A window already stored (a repeated batch) keeps its rows
+                    psycopg2.extras.execute_values(cursor, f"""
+                        INSERT INTO {table} (User_Id, {column}, timestamp_id) VALUES %s
+                        ON CONFLICT ({METRIC_UNIQUE_COLUMNS[key]}) DO NOTHING;
+                    """, values, page_size=BATCH_PAGE_SIZE)
+
+            if self.rollups:
+                self._update_rollups(cursor, windows)
+
+            self._notify_write(cursor, windows)
+            connection.commit()
+            self.last_used = time.monotonic()
+            logging.info(f"{len(windows)} windows committed to the database up to {timestamps[-1]}.")
+
+        except psycopg2.DatabaseError as e:
+            logging.error(f"Database error occurred: {e}")
+            if connection and not connection.closed:
                 connection.rollback()
+            raise
         finally:
-            if cursor:
+            if cursor and not cursor.closed:
                 cursor.close()
-            if connection:
-                connection.close()
-            logging.info("Database connection closed.")
 
-    def _insert_fuel_level(self, cursor, timestamp_id, fuel_level):
-        if fuel_level is not None:
-            cursor.execute("""
-                INSERT INTO Fuel_level (User_Id, fuel, timestamp_id)
-                VALUES (%s, %s, %s);
-            """, (self.userid, fuel_level, timestamp_id))
+    def _write_window(self, timestamp, data: Dict[str, Any]) -> None:
+        connection = None
+        cursor = None
+        try:
+            connection = self._get_connection()
+            cursor = connection.cursor()
 
-    def _insert_fuel_cons(self, cursor, timestamp_id, fuel_cons):
-        if fuel_cons is not None:
-            cursor.execute("""
-                INSERT INTO Fuel_cons (User_Id, consumption, timestamp_id)
-                VALUES (%s, %s, %s);
-            """, (self.userid, fuel_cons, timestamp_id))
+            timestamp_str = timestamp.strftime('%Y-%m-%d %H:%M:%S')
 
-    def _insert_rpm(self, cursor, timestamp_id, rpm):
-        if rpm is not None:
-            cursor.execute("""
-                INSERT INTO RPM (User_Id, amount, timestamp_id)
-                VALUES (%s, %s, %s);
-            """, (self.userid, rpm, timestamp_id))
+            # Reuses the id of an existing timestamp row
+            cursor.execute("EXECUTE upsert_timestamp (%s);", (timestamp_str,))
+            timestamp_id = cursor.fetchone()[0]
 
-    def _insert_coolant(self, cursor, timestamp_id, coolant):
-        if coolant is not None:
-            cursor.execute("""
-                INSERT INTO Coolant (User_Id, temp, timestamp_id)
-                VALUES (%s, %s, %s);
-            """, (self.userid, coolant, timestamp_id))
+            # Insert data into the respective tables
+            for key in METRIC_TABLES:
+                self._insert_metric(cursor, key, timestamp_id, data.get(key))
 
-    def _insert_intake_manifold(self, cursor, timestamp_id, intake_manifold):
-        if intake_manifold is not None:
-            cursor.execute("""
-                INSERT INTO Intake_manifold (User_Id, level, timestamp_id)
-                VALUES (%s, %s, %s);
-            """, (self.userid, intake_manifold, timestamp_id))
+            if self.rollups:
+                self._update_rollups(cursor, [(timestamp, data)])
 
-    def _insert_mass_air_flow(self, cursor, timestamp_id, mass_air_flow):
-        if mass_air_flow is not None:
-            cursor.execute("""
-                INSERT INTO Mass_air_flow (User_Id, air_flow, timestamp_id)
-                VALUES (%s, %s, %s);
-            """, (self.userid, mass_air_flow, timestamp_id))
+            self._notify_write(cursor, [(timestamp, data)])
+            connection.commit()
+            self.last_used = time.monotonic()
+            logging.info(f"Data committed to the database at {timestamp_str}.")
 
-    def _insert_oxygen(self, cursor, timestamp_id, oxygen):
-        if oxygen is not None:
-            cursor.execute("""
-                INSERT INTO Oxygen (User_Id, oxygen_level, timestamp_id)
-                VALUES (%s, %s, %s);
-            """, (self.userid, oxygen, timestamp_id))
+        except psycopg2.DatabaseError as e:
+            logging.error(f"Database error occurred: {e}")
+            if connection and not connection.closed:
+                connection.rollback()
+            raise
+        except Exception as e:
+            logging.error(f"Failed to insert data: {e}")
+            if connection and not connection.closed:
+                connection.rollback()
+        finally:
+            if cursor and not cursor.closed:
+                cursor.close()
 
-    def _insert_speed(self, cursor, timestamp_id, speed):
-        if speed is not None:
-            cursor.execute("""
-                INSERT INTO Speed_kph (User_Id, speed, timestamp_id)
-                VALUES (%s, %s, %s);
-            """, (self.userid, speed, timestamp_id))
+    def _notify_write(self, cursor, windows: List[Tuple[datetime, Dict[str, Any]]]) -> None:
+        # Delivered by Postgres when the transaction commits, not before
+        earliest = int((min(timestamp for timestamp, _ in windows) - EPOCH).total_seconds())
+        cursor.execute("SELECT pg_notify(%s, %s);", (WRITE_CHANNEL, f"{self.userid} {earliest}"))
 
-    def _insert_throttle(self, cursor, timestamp_id, throttle):
-        if throttle is not None:
-            cursor.execute("""
-                INSERT INTO Throttle (User_Id, position, timestamp_id)
-                VALUES (%s, %s, %s);
-            """, (self.userid, throttle, timestamp_id))
-
-    def _insert_diagnostic_codes(self, cursor, timestamp_id, diagnostic_codes):
-        if diagnostic_codes:
-            for code in diagnostic_codes:
-                cursor.execute("""
-                    INSERT INTO DC (User_Id, code, timestamp_id)
-                    VALUES (%s, %s, %s);
-                """, (self.userid, code, timestamp_id))
-
-    def _insert_voltage(self, cursor, timestamp_id, voltage_value):
-        if voltage_value is not None:
-            cursor.execute("""
-                INSERT INTO voltage (User_Id, volt, timestamp_id)
-                VALUES (%s, %s, %s);
-            """, (self.userid, voltage_value, timestamp_id))
+    def _update_rollups(self, cursor, windows: List[Tuple[datetime, Dict[str, Any]]]) -> None:
+        # Recomputes the buckets the windows fall into from the stored rows, in
+        # the same transaction as the raw rows, so rollups never drift from them
+        # and a window written twice is not counted twice. The narrowest buckets
+        # are aggregated from the raw rows, every wider one from the buckets of
+        # the interval before it, each width being a multiple of the previous.
+        # Timestamps are stored to the second and bucketed on the epoch like DataAccess does.
+        epoch_seconds = sorted({int((timestamp - EPOCH).total_seconds()) for timestamp, _ in windows})
+        finer = None
+        for bucket_seconds in ROLLUP_INTERVALS:
+            params = {'user': self.userid, 'seconds': bucket_seconds, 'finer': finer, 'metrics': list(ROLLUP_METRICS)}
+            # Literal bounds rather than an array of buckets, so the planner sees how few rows they hold
+            ranges = []
+            for index, (start, end) in enumerate(self._bucket_ranges(epoch_seconds, bucket_seconds)):
+                params[f'start{index}'], params[f'end{index}'] = start, end
+                ranges.append(f"(ts >= %(start{index})s AND ts < %(end{index})s)")
+
+            source = self._rollup_source() if finer is None else """
+                SELECT metric, bucket AS ts, sum, count, min, max
+                FROM metric_rollups
+                WHERE user_id = %(user)s AND bucket_seconds = %(finer)s AND metric = ANY(%(metrics)s)
+            """
+            cursor.execute(f"""
+                INSERT INTO metric_rollups (user_id, metric, bucket_seconds, bucket, sum, count, min, max)
+                SELECT
+                    %(user)s,
+                    metric,
+                    %(seconds)s,
+                    to_timestamp(floor(extract(epoch FROM ts) / %(seconds)s) * %(seconds)s) AT TIME ZONE 'UTC' AS bucket,
+                    sum(sum), sum(count), min(min), max(max)
+                FROM ({source}) samples
+                WHERE {' OR '.join(ranges)}
+                GROUP BY metric, bucket
+                ON CONFLICT (user_id, metric, bucket_seconds, bucket) DO UPDATE SET
+                    sum = EXCLUDED.sum,
+                    count = EXCLUDED.count,
+                    min = EXCLUDED.min,
+                    max = EXCLUDED.max;
+            """, params)
+            finer = bucket_seconds
+
+    def _bucket_ranges(self, epoch_seconds: List[int], bucket_seconds: int) -> List[Tuple[datetime, datetime]]:
+        # [start, end) of the buckets holding the sorted epoch seconds, adjacent buckets merged
+        ranges: List[List[int]] = []
+        for second in epoch_seconds:
+            bucket = second - second % bucket_seconds
+            if ranges and bucket <= ranges[-1][1]:
+                ranges[-1][1] = bucket + bucket_seconds
+            else:
+                ranges.append([bucket, bucket + bucket_seconds])
+        return [(EPOCH + timedelta(seconds=start), EPOCH + timedelta(seconds=end)) for start, end in ranges]
 
+    def _rollup_source(self) -> str:
+        # Raw samples of the rolled up metrics, shaped like metric_rollups rows
+        if self.storage == 'wide':
+            values = ', '.join(f"('{metric}', t.{metric})" for metric in ROLLUP_METRICS)
+            return f"""
+                SELECT v.metric, t.ts, v.value AS sum, 1 AS count, v.value AS min, v.value AS max
+                FROM telemetry t
+                CROSS JOIN LATERAL (VALUES {values}) v (metric, value)
+                WHERE t.user_id = %(user)s AND v.value IS NOT NULL
+            """
+        branches = []
+        for metric in ROLLUP_METRICS:
+            table, column = METRIC_TABLES[metric]
+            branches.append(f"""
+                SELECT '{metric}' AS metric, t.timestamp AS ts, m.{column} AS sum, 1 AS count, m.{column} AS min, m.{column} AS max
+                FROM timestamps t
+                JOIN {table} m ON m.timestamp_id = t.id AND m.User_Id = %(user)s
+            """)
+        return ' UNION ALL '.join(branches)
 
+    def _insert_metric(self, cursor, key: str, timestamp_id: int, value: Optional[Any]) -> None:
+        if key == 'diagnostic_codes':
+            if value:
+                for code in value:
+                    cursor.execute(f"EXECUTE insert_{key} (%s, %s, %s);", (self.userid, code, timestamp_id))
+        elif value is not None:
+            cursor.execute(f"EXECUTE insert_{key} (%s, %s, %s);", (self.userid, value, timestamp_id))
@@ -0,0 +1,124 @@
+import mmap
+import os
+import struct
+import tempfile
+import time
+import numpy as np
+from typing import Dict, Any, Optional, Tuple
+
+# Numeric channels in the order their float64 slots appear in the segment.
+# Changing it changes the layout, so LAYOUT_VERSION has to change with it.
+CHANNELS = (
+    'speed', 'rpm', 'fuel_level', 'fuel_cons', 'mass_air_flow', 'oxygen',
+    'throttle', 'coolant', 'intake_manifold', 'battery',
+)
+LAYOUT_VERSION = 1
+
+MAGIC = b'OBDL'
+# magic, layout version, channel count, padding, sequence, timestamp (epoch seconds)
+HEADER = struct.Struct('<4sIIIQd')
+SEQUENCE = struct.Struct('<Q')
+SEQUENCE_OFFSET = 16
+TIMESTAMP = struct.Struct('<d')
+TIMESTAMP_OFFSET = 24
+VALUES_OFFSET = HEADER.size
+SEGMENT_SIZE = VALUES_OFFSET + 8 * len(CHANNELS)
+
+# tmpfs, so the segment never touches the SD card
+LATEST_PATH = os.path.join('/dev/shm' if os.path.isdir('/dev/shm') else tempfile.gettempdir(), 'obd_latest_values')
+
+# Seconds a reader keeps retrying before giving up, e.g. on a writer that died mid-write
+READ_TIMEOUT = 0.1
+
+
+class LatestValuesWriter:
+    # Single writer of a fixed-layout shared-memory segment holding the latest
+    # value of every channel (NaN until first read). Each write is a seqlock
+    # update: the sequence goes odd, the values are copied in, the sequence
+    # goes even. The writer never waits for readers.
+    def __init__(self, path: str = LATEST_PATH) -> None:
+        self.path = path
+        fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            os.ftruncate(fd, SEGMENT_SIZE)
+            self.mm = mmap.mmap(fd, SEGMENT_SIZE, mmap.MAP_SHARED, mmap.PROT_READ | mmap.PROT_WRITE)
+        finally:
+            os.close(fd)
+
+        self.sequence = 0
+        self.values = np.full(len(CHANNELS), np.nan, dtype='<f8')
+        self.slots = {name: index for index, name in enumerate(CHANNELS)}
+        # Writable view of the value slots, a write is one memcpy
+        self.view = np.frombuffer(self.mm, dtype='<f8', count=len(CHANNELS), offset=VALUES_OFFSET)
+
+        HEADER.pack_into(self.mm, 0, MAGIC, LAYOUT_VERSION, len(CHANNELS), 0, self.sequence, 0.0)
+        self.view[:] = self.values
+
+    def write(self, data: Dict[str, Any], timestamp: Optional[float] = None) -> None:
+        # Channels missing from data keep their previous value
+        for key, value in data.items():
+            slot = self.slots.get(key)
+            if slot is not None and isinstance(value, (int, float)):
+                self.values[slot] = value
+
+        self.sequence += 1
+        SEQUENCE.pack_into(self.mm, SEQUENCE_OFFSET, self.sequence)
+        TIMESTAMP.pack_into(self.mm, TIMESTAMP_OFFSET, time.time() if timestamp is None else timestamp)
+        self.view[:] = self.values
+        self.sequence += 1
+        SEQUENCE.pack_into(self.mm, SEQUENCE_OFFSET, self.sequence)
+
+    def close(self) -> None:
+        # The segment is left in place, readers see the last values and their timestamp
+        del self.view
+        self.mm.close()
+
+
+class LatestValuesReader:
+    # Lock-free reader for any number of local processes (display, web service).
+    # A read copies the header and the value slots and retries while the
+    # sequence is odd or changed during the copy.
+    def __init__(self, path: str = LATEST_PATH) -> None:
+        fd = os.open(path, os.O_RDONLY)
+        try:
+            self.mm = mmap.mmap(fd, SEGMENT_SIZE, mmap.MAP_SHARED, mmap.PROT_READ)
+        finally:
+            os.close(fd)
+
+        magic, version, count, _, _, _ = HEADER.unpack_from(self.mm, 0)
+        if magic != MAGIC or version != LAYOUT_VERSION or count != len(CHANNELS):
+            self.mm.close()
+            raise ValueError(f"{path} is not a layout {LAYOUT_VERSION} latest values segment")
+        self.values = struct.Struct(f'<{len(CHANNELS)}d')
+
+    def sequence(self) -> int:
+        # Cheap change check, the sequence grows by two with every write
+        return SEQUENCE.unpack_from(self.mm, SEQUENCE_OFFSET)[0]
+
+    def read(self) -> Tuple[int, float, Dict[str, float]]:
+        # (sequence, timestamp, {channel: value}) from one consistent write
+        deadline = None
+        while True:
+            before = SEQUENCE.unpack_from(self.mm, SEQUENCE_OFFSET)[0]
+            if not before % 2:
+                timestamp = TIMESTAMP.unpack_from(self.mm, TIMESTAMP_OFFSET)[0]
+                values = self.values.unpack_from(self.mm, VALUES_OFFSET)
+                if SEQUENCE.unpack_from(self.mm, SEQUENCE_OFFSET)[0] == before:
+                    return before, timestamp, dict(zip(CHANNELS, values))
+
+            # Raced with a write, let the writer finish
+            now = time.monotonic()
+            if deadline is None:
+                deadline = now + READ_TIMEOUT
+            elif now > deadline:
+                raise RuntimeError("Latest values kept changing during the read")
+            time.sleep(0)
+
+    def read_if_newer(self, sequence: int) -> Optional[Tuple[int, float, Dict[str, float]]]:
+        # None when nothing was written since the read that returned sequence
+        if self.sequence() == sequence:
+            return None
+        return self.read()
+
+    def close(self) -> None:
+        self.mm.close()
@@ -0,0 +1,153 @@
+import json
+import logging
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, List, Optional
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+# Seconds between SSE comments sent to idle clients, so proxies and browsers keep the stream open
+KEEPALIVE_INTERVAL = 15.0
+
+# Port the live feed listens on next to the Flask (5000) and Dash (8051) services
+LIVE_PORT = 8765
+
+
+class Subscription:
+    # Single-slot mailbox: a new snapshot replaces one the client has not
+    # taken yet, so a slow client skips snapshots instead of queueing them
+    def __init__(self) -> None:
+        self.condition = threading.Condition()
+        self.item: Any = None
+        self.pending = False
+        self.closed = False
+        self.coalesced = 0
+
+    def offer(self, item: Any) -> None:
+        with self.condition:
+            if self.pending:
+                self.coalesced += 1
+            self.item = item
+            self.pending = True
+            self.condition.notify()
+
+    def get(self, timeout: float) -> Optional[Any]:
+        # The newest snapshot, or None after timeout or once closed
+        with self.condition:
+            if not self.pending and not self.closed:
+                self.condition.wait(timeout)
+            if not self.pending:
+                return None
+            self.pending = False
+            return self.item
+
+    def close(self) -> None:
+        with self.condition:
+            self.closed = True
+            self.condition.notify()
+
+
+class LiveHub:
+    # In-process fan-out of snapshots, publish() never waits for a subscriber
+    def __init__(self) -> None:
+        self.lock = threading.Lock()
+        self.subscriptions: List[Subscription] = []
+        self.latest: Any = None
+
+    def subscribe(self) -> Subscription:
+        subscription = Subscription()
+        with self.lock:
+            self.subscriptions.append(subscription)
+            latest = self.latest
+        if latest is not None:
+            # A new client starts from the current state rather than waiting for the next change
+            subscription.offer(latest)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription) -> None:
+        with self.lock:
+            if subscription in self.subscriptions:
+                self.subscriptions.remove(subscription)
+        subscription.close()
+
+    def publish(self, item: Any) -> None:
+        with self.lock:
+            self.latest = item
+            subscriptions = list(self.subscriptions)
+        for subscription in subscriptions:
+            subscription.offer(item)
+
+    def close(self) -> None:
+        with self.lock:
+            subscriptions, self.subscriptions = self.subscriptions, []
+        for subscription in subscriptions:
+            subscription.close()
+
+
+class LiveRequestHandler(BaseHTTPRequestHandler):
+    # GET /live is a Server-Sent Events stream of snapshots as JSON,
+    # GET /latest returns the current snapshot once
+    hub: LiveHub
+
+    def do_GET(self) -> None:
+        if self.path == '/latest':
+            self._send_latest()
+        elif self.path == '/live':
+            self._stream()
+        else:
+            self.send_error(404)
+
+    def _send_latest(self) -> None:
+        body = json.dumps(self.hub.latest).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.send_header('Access-Control-Allow-Origin', '*')
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _stream(self) -> None:
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream')
+        self.send_header('Cache-Control', 'no-cache')
+        self.send_header('Access-Control-Allow-Origin', '*')
+        self.end_headers()
+
+        subscription = self.hub.subscribe()
+        try:
+            while not subscription.closed:
+                snapshot = subscription.get(KEEPALIVE_INTERVAL)
+                if snapshot is None:
+                    self.wfile.write(b': keepalive\n\n')
+                else:
+                    self.wfile.write(b'data: ' + json.dumps(snapshot).encode() + b'\n\n')
+                self.wfile.flush()
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+        finally:
+            self.hub.unsubscribe(subscription)
+            if subscription.coalesced:
+                logging.info(f"Live client {self.client_address[0]} left, {subscription.coalesced} snapshots coalesced.")
+
+    def log_message(self, format: str, *args: Any) -> None:
+        logging.debug(f"Live feed {self.client_address[0]}: {format % args}")
+
+
+class LiveServer:
+    # Serves a LiveHub over HTTP from its own threads, one per client
+    def __init__(self, hub: LiveHub, host: str = '0.0.0.0', port: int = LIVE_PORT) -> None:
+        self.hub = hub
+        handler = type('BoundLiveRequestHandler', (LiveRequestHandler,), {'hub': hub})
+        self.server = ThreadingHTTPServer((host, port), handler)
+        self.server.daemon_threads = True
+        self.thread = threading.Thread(target=self.server.serve_forever, name='live-feed', daemon=True)
+
+    def start(self) -> None:
+        self.thread.start()
+        host, port = self.server.server_address[:2]
+        logging.info(f"Live feed on http://{host}:{port}/live")
+
+    def stop(self) -> None:
+        self.hub.close()
+        self.server.shutdown()
+        self.server.server_close()
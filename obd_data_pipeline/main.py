@@ -1,15 +1,24 @@
 import obd
 import logging
-from datetime import datetime, timedelta
-import time
 from buffer.buffer import Buffer
 from obd_read.obd_reader import ObdReader
+from scheduler.scheduler import PidScheduler
 from data_writer.database_writer import DatabaseWriter
+from pipeline.pipeline import Pipeline
+from spool.spool import Spool
+from live.live import LiveHub
+from live.live import LiveServer
+from latest_values.latest_values import LatestValuesWriter
 from test.fake_obd import FakeOBD
 
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
+# Local store-and-forward file, kept on the SD card so windows survive a power cut
+SPOOL_PATH = "obd_spool.sqlite3"
+
 def main(connection=None):
+    # Created inside the try, so cleanup only touches what was started
+    writer = spool = live_server = latest_values = None
     try:
         # Use the provided connection or default to a real OBD connection
         connection = connection or obd.OBD()
@@ -22,46 +31,38 @@ def main(connection=None):
             return
         
         reader = ObdReader(connection)
-        buff = Buffer()
-        before_time = datetime.now()
-
-        while True:
-            data = {
-                'fuel_level': reader.get_fuel_level(),
-                'fuel_cons': reader.get_fuel_cons(),
-                'rpm': reader.get_rpm(),
-                'coolant': reader.get_coolant_temp(),
-                'battery': reader.get_battery_voltage(),
-                'intake_manifold': reader.get_intake_manifold_pressure(),
-                'mass_air_flow': reader.get_maf(),
-                'oxygen': reader.get_oxygen_sensor(),
-                'speed': reader.get_speed(),
-                'throttle': reader.get_throttle_position(),
-                'diagnostic_codes': reader.get_diagnostic_codes()
-            }
-
-            filtered_data = {k: v for k, v in data.items() if v is not None}
-            buff.update_buffer(filtered_data)
+        scheduler = PidScheduler(reader)
+        # Keeps the last 600 samples per channel (two minutes at 5 Hz) for the display
+        buff = Buffer(streaming=True, history_size=600)
+        # Set rollups=True once database/rollups.sql and its backfill migration have been applied
+        writer = DatabaseWriter(dbname="car_data", user="mitchellbreust", userid=1, rollups=False)
+        spool = Spool(SPOOL_PATH)
 
-            current_time = datetime.now()
-            if current_time - before_time >= timedelta(seconds=5):  
-                averages = buff.give_average_of_data()
-                diagnostics = buff.get_diagnostic_codes()
-                if diagnostics:
-                    averages['diagnostic_codes'] = diagnostics
+        # Every aggregated snapshot is pushed to browsers over Server-Sent Events
+        hub = LiveHub()
+        live_server = LiveServer(hub)
+        live_server.start()
 
-                writer = DatabaseWriter(dbname="car_data", user="mitchellbreust", userid=1)
-                writer.insert_new_data(before_time, averages)
+        # Latest value of every channel in shared memory for the on-device display
+        latest_values = LatestValuesWriter()
 
-                before_time = current_time
-                buff.clear_buffer()
-
-            time.sleep(0.5)
+        # Acquisition, aggregation and database writes run as separate stages,
+        # so a slow or unavailable database never stalls sampling
+        pipeline = Pipeline(scheduler, buff, writer, spool=spool, hub=hub, latest_values=latest_values)
+        pipeline.run()
 
     except Exception as e:
         logging.error(f"An error occurred: {e}")
     finally:
-        if connection.is_connected():
+        if live_server is not None:
+            live_server.stop()
+        if latest_values is not None:
+            latest_values.close()
+        if writer is not None:
+            writer.close()
+        if spool is not None:
+            spool.close()
+        if connection is not None and connection.is_connected():
             connection.close()
             logging.info("OBD-II connection closed.")
 
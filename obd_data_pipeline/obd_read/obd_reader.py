@@ -1,26 +1,98 @@
 import obd
 import sys
+import time
 import logging
-from typing import Optional, List
+from typing import Optional, List, Dict, Any, Iterable, Tuple
 
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
+# Channels read straight from a single PID: channel -> (command, unit to convert to)
+PID_CHANNELS = {
+    'fuel_level': (obd.commands.FUEL_LEVEL, None),
+    'rpm': (obd.commands.RPM, None),
+    'coolant': (obd.commands.COOLANT_TEMP, "degC"),
+    'battery': (obd.commands.ELM_VOLTAGE, None),
+    'intake_manifold': (obd.commands.INTAKE_PRESSURE, "kPa"),
+    'mass_air_flow': (obd.commands.MAF, "g/s"),
+    'oxygen': (obd.commands.O2_B1S1, None),
+    'speed': (obd.commands.SPEED, None),
+    'throttle': (obd.commands.THROTTLE_POS, None),
+    'diagnostic_codes': (obd.commands.GET_DTC, None),
+}
+
+# Channels computed from other PIDs: channel -> commands it may be derived from
+DERIVED_CHANNELS = {
+    'fuel_cons': (obd.commands.FUEL_RATE, obd.commands.SPEED, obd.commands.MAF),
+}
+
+ALL_CHANNELS = tuple(PID_CHANNELS) + tuple(DERIVED_CHANNELS)
+
+# Weight of the newest sample in the per-PID latency moving average
+LATENCY_SMOOTHING = 0.2
+
 class ObdReader:
     def __init__(self, connection) -> None:
         self.connection = connection
+        self.capabilities: Dict[Any, bool] = {}
+        self.dispatch: Dict[str, Tuple[Any, Optional[str]]] = {}
+        self.supported_channels: Tuple[str, ...] = ()
+        self.latencies: Dict[Any, float] = {}
         
         if not self.connection.is_connected():
             logging.error("OBD connection is not active.")
             raise ConnectionError("OBD connection is not active.")
 
+        self.probe_capabilities()
+
+    def reconnect(self, connection) -> None:
+        # The replacement adapter/vehicle may support a different set of PIDs
+        if not connection.is_connected():
+            logging.error("OBD connection is not active.")
+            raise ConnectionError("OBD connection is not active.")
+        self.connection = connection
+        self.probe_capabilities()
+
+    def probe_capabilities(self) -> None:
+        # Ask the vehicle once which PIDs it supports and keep a dispatch table
+        # of only the supported channels, so the read loop never calls supports()
+        self.capabilities = {}
+        for command, _ in PID_CHANNELS.values():
+            self.supports(command)
+        for command in DERIVED_CHANNELS['fuel_cons']:
+            self.supports(command)
+
+        self.dispatch = {
+            channel: (command, unit)
+            for channel, (command, unit) in PID_CHANNELS.items()
+            if self.capabilities[command]
+        }
+
+        channels = list(self.dispatch)
+        if self.supports(obd.commands.FUEL_RATE) or (self.supports(obd.commands.SPEED) and self.supports(obd.commands.MAF)):
+            channels.append('fuel_cons')
+        else:
+            logging.warning("fuel_cons cannot be calculated, neither FUEL_RATE nor SPEED and MAF are supported.")
+        self.supported_channels = tuple(channels)
+        logging.info(f"Supported channels: {', '.join(self.supported_channels)}")
+
+    def supports(self, command) -> bool:
+        supported = self.capabilities.get(command)
+        if supported is None:
+            supported = bool(self.connection.supports(command))
+            self.capabilities[command] = supported
+            if not supported:
+                logging.warning(f"{command.name} command not supported by this vehicle.")
+        return supported
+
     def query_obd(self, command) -> Optional[obd.OBDResponse]:
         try:
-            if not self.connection.supports(command):
-                logging.warning(f"{command.name} command not supported by this vehicle.")
+            if not self.supports(command):
                 return None
             
+            start = time.monotonic()
             response = self.connection.query(command)
+            self._record_latency(command, time.monotonic() - start)
             
             if response.is_null():
                 logging.warning(f"Failed to retrieve data for {command.name}.")
@@ -32,22 +104,85 @@ class ObdReader:
             logging.error(f"Error querying {command.name}: {e}")
             return None
 
+    def _record_latency(self, command, elapsed: float) -> None:
+        previous = self.latencies.get(command)
+        if previous is None:
+            self.latencies[command] = elapsed
+        else:
+            self.latencies[command] = previous + LATENCY_SMOOTHING * (elapsed - previous)
+
+    def channel_commands(self, channel: str) -> Tuple[Any, ...]:
+        # PIDs a channel costs on the bus when it is read
+        if channel in PID_CHANNELS:
+            return (PID_CHANNELS[channel][0],)
+        if channel == 'fuel_cons':
+            if self.supports(obd.commands.FUEL_RATE):
+                return (obd.commands.FUEL_RATE, obd.commands.SPEED)
+            return (obd.commands.SPEED, obd.commands.MAF)
+        return ()
+
+    def read_snapshot(self, channels: Optional[Iterable[str]] = None) -> Dict[str, Any]:
+        # Every PID is queried at most once per snapshot, computed channels
+        # (fuel consumption) reuse the responses already read for this cycle.
+        # Channels the vehicle does not support are skipped silently.
+        if channels is None:
+            channels = self.supported_channels
+        responses: Dict[Any, Optional[obd.OBDResponse]] = {}
+        snapshot: Dict[str, Any] = {}
+
+        for channel in channels:
+            entry = self.dispatch.get(channel)
+            if entry is not None:
+                command, unit = entry
+                response = self._query_once(command, responses)
+                snapshot[channel] = self._convert_response(channel, response, unit)
+            elif channel == 'fuel_cons':
+                if channel in self.supported_channels:
+                    snapshot[channel] = self._derive_fuel_cons(responses)
+            elif channel not in ALL_CHANNELS:
+                logging.warning(f"{channel} is not a recognized channel and will be ignored.")
+
+        return snapshot
+
+    def _query_once(self, command, responses: Dict[Any, Optional[obd.OBDResponse]]) -> Optional[obd.OBDResponse]:
+        if command not in responses:
+            if self.supports(command):
+                responses[command] = self.query_obd(command)
+            else:
+                responses[command] = None
+        return responses[command]
+
+    def _convert_response(self, channel: str, response: Optional[obd.OBDResponse], unit: Optional[str]) -> Any:
+        if not response:
+            return None
+        if channel == 'diagnostic_codes':
+            return self._parse_diagnostic_codes(response)
+        try:
+            value = response.value.to(unit) if unit else response.value
+            return float(value.magnitude)
+        except Exception as e:
+            logging.error(f"Error converting {channel}: {e}")
+            return None
+
     def get_battery_voltage(self) -> Optional[float]:
-        if not self.connection.supports(obd.commands.ELM_VOLTAGE):
+        if not self.supports(obd.commands.ELM_VOLTAGE):
             return None
         response = self.query_obd(obd.commands.ELM_VOLTAGE)
         return response.value.magnitude if response else None
 
     def get_coolant_temp(self) -> Optional[float]:
-        if not self.connection.supports(obd.commands.COOLANT_TEMP):
+        if not self.supports(obd.commands.COOLANT_TEMP):
             return None
         response = self.query_obd(obd.commands.COOLANT_TEMP)
         return response.value.to("degC").magnitude if response else None
 
     def get_diagnostic_codes(self) -> Optional[List[str]]:
-        if not self.connection.supports(obd.commands.GET_DTC):
+        if not self.supports(obd.commands.GET_DTC):
             return None
         response = self.query_obd(obd.commands.GET_DTC)
+        return self._parse_diagnostic_codes(response)
+
+    def _parse_diagnostic_codes(self, response: Optional[obd.OBDResponse]) -> Optional[List[str]]:
         if response and response.value:
             if isinstance(response.value, list):
                 if all(isinstance(item, str) for item in response.value):
@@ -62,15 +197,18 @@ class ObdReader:
         return None
 
     def get_fuel_cons(self) -> Optional[float]:
+        return self._derive_fuel_cons({})
+
+    def _derive_fuel_cons(self, responses: Dict[Any, Optional[obd.OBDResponse]]) -> Optional[float]:
         # First attempt using FUEL_RATE directly
-        if self.connection.supports(obd.commands.FUEL_RATE):
+        if self.supports(obd.commands.FUEL_RATE):
             try:
-                fuel_rate_response = self.query_obd(obd.commands.FUEL_RATE)
+                fuel_rate_response = self._query_once(obd.commands.FUEL_RATE, responses)
 
                 if fuel_rate_response:
                     fuel_rate = fuel_rate_response.value.to("L/h").magnitude  # Fuel rate in liters per hour
 
-                    speed_response = self.query_obd(obd.commands.SPEED)
+                    speed_response = self._query_once(obd.commands.SPEED, responses)
                     if speed_response:
                         speed_kmh = speed_response.value.to("km/h").magnitude
                     else:
@@ -86,10 +224,10 @@ class ObdReader:
                 logging.error(f"Failed to calculate fuel consumption using FUEL_RATE: {e}")
 
         # Fallback method using SPEED and MAF
-        if self.connection.supports(obd.commands.SPEED) and self.connection.supports(obd.commands.MAF):
+        if self.supports(obd.commands.SPEED) and self.supports(obd.commands.MAF):
             try:
-                speed_response = self.query_obd(obd.commands.SPEED)
-                maf_response = self.query_obd(obd.commands.MAF)
+                speed_response = self._query_once(obd.commands.SPEED, responses)
+                maf_response = self._query_once(obd.commands.MAF, responses)
 
                 if speed_response and maf_response:
                     speed_kmh = speed_response.value.to("km/h").magnitude
@@ -111,37 +249,37 @@ class ObdReader:
         return None
 
     def get_fuel_level(self) -> Optional[float]:
-        if not self.connection.supports(obd.commands.FUEL_LEVEL):
+        if not self.supports(obd.commands.FUEL_LEVEL):
             return None
         response = self.query_obd(obd.commands.FUEL_LEVEL)
         return response.value.magnitude if response else None
 
     def get_intake_manifold_pressure(self) -> Optional[float]:
-        if not self.connection.supports(obd.commands.INTAKE_PRESSURE):
+        if not self.supports(obd.commands.INTAKE_PRESSURE):
             return None
         response = self.query_obd(obd.commands.INTAKE_PRESSURE)
         return response.value.to("kPa").magnitude if response else None
 
     def get_maf(self) -> Optional[float]:
-        if not self.connection.supports(obd.commands.MAF):
+        if not self.supports(obd.commands.MAF):
             return None
         response = self.query_obd(obd.commands.MAF)
         return response.value.to("g/s").magnitude if response else None
 
     def get_oxygen_sensor(self) -> Optional[float]:
-        if not self.connection.supports(obd.commands.O2_B1S1):
+        if not self.supports(obd.commands.O2_B1S1):
             return None
         response = self.query_obd(obd.commands.O2_B1S1)
         return response.value.magnitude if response else None
 
     def get_rpm(self) -> Optional[float]:
-        if not self.connection.supports(obd.commands.RPM):
+        if not self.supports(obd.commands.RPM):
             return None
         response = self.query_obd(obd.commands.RPM)
         return response.value.magnitude if response else None
 
     def get_speed(self) -> Optional[float]:
-        if not self.connection.supports(obd.commands.SPEED):
+        if not self.supports(obd.commands.SPEED):
             return None
         response = self.query_obd(obd.commands.SPEED)
         if response and response.value:
@@ -153,7 +291,7 @@ class ObdReader:
         return None
 
     def get_throttle_position(self) -> Optional[float]:
-        if not self.connection.supports(obd.commands.THROTTLE_POS):
+        if not self.supports(obd.commands.THROTTLE_POS):
             return None
         response = self.query_obd(obd.commands.THROTTLE_POS)
         return response.value.magnitude if response else None
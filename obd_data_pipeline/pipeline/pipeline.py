@@ -0,0 +1,259 @@
+import logging
+import threading
+from collections import deque
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from buffer.buffer import Buffer
+from data_writer.database_writer import DatabaseWriter
+from live.live import LiveHub
+from latest_values.latest_values import LatestValuesWriter
+from scheduler.scheduler import PidScheduler
+from spool.spool import Spool
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+# What a full queue does with a new item
+BLOCK = 'block'              # producer waits for the consumer (backpressure)
+DROP_OLDEST = 'drop_oldest'  # oldest queued item is discarded
+COALESCE = 'coalesce'        # two oldest queued items are merged into one
+
+Window = Tuple[datetime, Dict[str, Any]]
+
+# Key of a window's {channel: number of samples averaged}, the writer ignores it
+SAMPLE_COUNTS = 'sample_counts'
+
+# Windows replayed from the spool per insert_batch call
+FORWARD_BATCH_SIZE = 500
+
+# Wait between forwarding attempts while Postgres is unavailable, doubled up to the maximum
+FORWARD_BACKOFF = 1.0
+FORWARD_MAX_BACKOFF = 60.0
+
+
+class BoundedQueue:
+    def __init__(self, name: str, maxsize: int, policy: str = BLOCK,
+                 coalesce: Optional[Callable[[Any, Any], Any]] = None) -> None:
+        if policy not in (BLOCK, DROP_OLDEST, COALESCE):
+            raise ValueError(f"Unknown queue policy: {policy}")
+        if policy == COALESCE and (coalesce is None or maxsize < 2):
+            raise ValueError("Coalescing queue needs a coalesce function and room for two items")
+
+        self.name = name
+        self.maxsize = maxsize
+        self.policy = policy
+        self.coalesce = coalesce
+        self.items: deque = deque()
+        self.condition = threading.Condition()
+        self.dropped = 0
+        self.coalesced = 0
+
+    def put(self, item: Any, stop: Optional[threading.Event] = None) -> None:
+        with self.condition:
+            if len(self.items) >= self.maxsize:
+                if self.policy == BLOCK:
+                    while len(self.items) >= self.maxsize and not (stop and stop.is_set()):
+                        self.condition.wait(0.5)
+                elif self.policy == DROP_OLDEST:
+                    self.items.popleft()
+                    self.dropped += 1
+                    logging.warning(f"{self.name} queue full, dropped oldest item ({self.dropped} so far).")
+                else:
+                    oldest = self.items.popleft()
+                    self.items[0] = self.coalesce(oldest, self.items[0])
+                    self.coalesced += 1
+                    logging.warning(f"{self.name} queue full, coalesced two oldest items ({self.coalesced} so far).")
+            self.items.append(item)
+            self.condition.notify_all()
+
+    def get_batch(self, max_items: int, timeout: float) -> List[Any]:
+        # Waits up to timeout for at least one item and takes everything queued up to max_items
+        with self.condition:
+            if not self.items:
+                self.condition.wait(timeout)
+            batch = []
+            while self.items and len(batch) < max_items:
+                batch.append(self.items.popleft())
+            if batch:
+                self.condition.notify_all()
+            return batch
+
+    def __len__(self) -> int:
+        with self.condition:
+            return len(self.items)
+
+
+def coalesce_windows(older: Window, newer: Window) -> Window:
+    # Keeps the older window's timestamp, each value becomes the mean of both
+    # windows' samples, weighted by their sample counts (1 when a window has none)
+    timestamp, older_data = older
+    _, newer_data = newer
+    older_counts = older_data.get(SAMPLE_COUNTS) or {}
+    newer_counts = newer_data.get(SAMPLE_COUNTS) or {}
+    merged: Dict[str, Any] = {}
+    counts: Dict[str, int] = {}
+    for key in (older_data.keys() | newer_data.keys()) - {SAMPLE_COUNTS}:
+        a, b = older_data.get(key), newer_data.get(key)
+        if key == 'diagnostic_codes':
+            codes = list(dict.fromkeys((a or []) + (b or [])))
+            merged[key] = codes or None
+        elif a is None:
+            merged[key] = b
+            if b is not None:
+                counts[key] = newer_counts.get(key, 1)
+        elif b is None:
+            merged[key] = a
+            counts[key] = older_counts.get(key, 1)
+        else:
+            a_count, b_count = older_counts.get(key, 1), newer_counts.get(key, 1)
+            merged[key] = (a * a_count + b * b_count) / (a_count + b_count)
+            counts[key] = a_count + b_count
+    merged[SAMPLE_COUNTS] = counts
+    return timestamp, merged
+
+
+class Pipeline:
+    def __init__(self, scheduler: PidScheduler, buffer: Buffer, writer: DatabaseWriter,
+                 window: timedelta = timedelta(seconds=5),
+                 sample_queue_size: int = 256, window_queue_size: int = 120,
+                 spool: Optional[Spool] = None, hub: Optional[LiveHub] = None,
+                 latest_values: Optional[LatestValuesWriter] = None) -> None:
+        self.scheduler = scheduler
+        self.buffer = buffer
+        self.writer = writer
+        self.window = window
+        self.spool = spool
+        self.hub = hub
+        self.latest_values = latest_values
+        # Last known value of every channel. The buffer forgets its values at
+        # each window flush, so published snapshots are merged into this.
+        self.latest: Dict[str, Any] = {}
+
+        # Acquisition -> aggregation: samples are cheap to lose, the reader must never wait
+        self.samples = BoundedQueue('sample', sample_queue_size, DROP_OLDEST)
+        # Aggregation -> persistence: windows are merged rather than lost when the writer lags
+        self.windows = BoundedQueue('window', window_queue_size, COALESCE, coalesce_windows)
+
+        self.stop_event = threading.Event()
+        self.threads = [
+            threading.Thread(target=self._run_stage, args=(self._acquire,), name='acquisition', daemon=True),
+            threading.Thread(target=self._run_stage, args=(self._aggregate,), name='aggregation', daemon=True),
+            threading.Thread(target=self._run_stage, args=(self._persist,), name='persistence', daemon=True),
+        ]
+        if self.spool is not None:
+            # Windows go to the local spool first, a forwarder drains it into Postgres
+            self.threads.append(
+                threading.Thread(target=self._run_stage, args=(self._forward,), name='forwarder', daemon=True)
+            )
+
+    def start(self) -> None:
+        for thread in self.threads:
+            thread.start()
+
+    def stop(self) -> None:
+        self.stop_event.set()
+
+    def join(self, timeout: Optional[float] = None) -> None:
+        for thread in self.threads:
+            thread.join(timeout)
+
+    def run(self) -> None:
+        self.start()
+        try:
+            while not self.stop_event.wait(1.0):
+                pass
+        except KeyboardInterrupt:
+            logging.info("Stopping pipeline.")
+        finally:
+            self.stop()
+            self.join()
+
+    def _run_stage(self, stage: Callable[[], None]) -> None:
+        try:
+            stage()
+        except Exception as e:
+            logging.error(f"An error occurred in the {threading.current_thread().name} stage: {e}")
+            self.stop()
+
+    def _acquire(self) -> None:
+        report_time = datetime.now()
+        while not self.stop_event.is_set():
+            data = self.scheduler.poll()
+            filtered_data = {k: v for k, v in data.items() if v is not None}
+            if filtered_data:
+                sample_time = datetime.now()
+                if self.latest_values is not None:
+                    # Local readers see the sample straight from the reader thread
+                    self.latest_values.write(filtered_data, sample_time.timestamp())
+                self.samples.put((sample_time, filtered_data))
+
+            if datetime.now() - report_time >= self.window:
+                self.scheduler.log_rate_report()
+                self.scheduler.reset_rate_report()
+                report_time = datetime.now()
+
+    def _aggregate(self) -> None:
+        before_time = datetime.now()
+        while not self.stop_event.is_set():
+            batch = self.samples.get_batch(self.samples.maxsize, timeout=0.5)
+            for sample_time, data in batch:
+                self.buffer.update_buffer(data, sample_time.timestamp())
+            if batch and self.hub is not None:
+                self._publish(batch[-1][0])
+
+            current_time = datetime.now()
+            if current_time - before_time >= self.window:
+                averages = self.buffer.give_average_of_data()
+                averages[SAMPLE_COUNTS] = self.buffer.get_sample_counts()
+                diagnostics = self.buffer.get_diagnostic_codes()
+                if diagnostics:
+                    # Copied, the buffer's list is cleared before the writer gets to it
+                    averages['diagnostic_codes'] = list(diagnostics)
+
+                self.windows.put((before_time, averages), self.stop_event)
+
+                before_time = current_time
+                self.buffer.clear_buffer()
+
+    def _publish(self, sample_time: datetime) -> None:
+        # Pushed to live clients as soon as the samples are aggregated, long before the window is written
+        self.latest.update((k, v) for k, v in self.buffer.get_latest_data().items() if v is not None)
+        self.hub.publish({'timestamp': sample_time.timestamp(), **self.latest})
+
+    def _persist(self) -> None:
+        while not self.stop_event.is_set():
+            # Everything queued while the previous write ran goes out in one batch
+            windows = self.windows.get_batch(self.windows.maxsize, timeout=0.5)
+            if not windows:
+                continue
+            if self.spool is not None:
+                try:
+                    self.spool.append(windows)
+                except Exception as e:
+                    # Sampling carries on, the windows are lost
+                    logging.error(f"Failed to spool {len(windows)} windows from {windows[0][0]}: {e}")
+                continue
+            try:
+                self.writer.insert_batch(windows)
+            except Exception as e:
+                # Sampling carries on, the windows are lost
+                logging.error(f"Failed to persist {len(windows)} windows from {windows[0][0]}: {e}")
+
+    def _forward(self) -> None:
+        # Drains the spool oldest first in bulk, so a backlog left by an outage
+        # (or by a power cut) is replayed at insert_batch speed
+        delay = FORWARD_BACKOFF
+        while not self.stop_event.is_set():
+            batch = self.spool.read_batch(FORWARD_BATCH_SIZE)
+            if not batch:
+                self.spool.wait(timeout=1.0)
+                continue
+            try:
+                self.writer.insert_batch([window for _, window in batch])
+            except Exception as e:
+                logging.error(f"Failed to forward {len(batch)} spooled windows, retrying in {delay:.0f}s: {e}")
+                self.stop_event.wait(delay)
+                delay = min(delay * 2, FORWARD_MAX_BACKOFF)
+                continue
+            self.spool.commit(batch[-1][0])
+            delay = FORWARD_BACKOFF
@@ -0,0 +1,142 @@
+import time
+import logging
+from typing import Dict, Any, Optional, Callable, List
+
+from obd_read.obd_reader import ObdReader
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+# Target poll rate of each channel in Hz
+DEFAULT_RATES: Dict[str, float] = {
+    'speed': 5.0,
+    'rpm': 5.0,
+    'throttle': 2.0,
+    'fuel_cons': 2.0,
+    'mass_air_flow': 2.0,
+    'intake_manifold': 1.0,
+    'oxygen': 1.0,
+    'battery': 0.2,
+    'coolant': 0.1,
+    'fuel_level': 0.1,
+    'diagnostic_codes': 1 / 60,
+}
+
+# Assumed ELM327 round trip (seconds) for a PID that has not been measured yet
+DEFAULT_LATENCY = 0.075
+
+# A channel is reported as falling behind below this fraction of its target rate
+SATURATION_THRESHOLD = 0.9
+
+
+class ChannelSchedule:
+    __slots__ = ('name', 'rate', 'period', 'next_due', 'reads')
+
+    def __init__(self, name: str, rate: float, start: float) -> None:
+        self.name = name
+        self.rate = rate
+        self.period = 1.0 / rate
+        self.next_due = start
+        self.reads = 0
+
+
+class PidScheduler:
+    def __init__(self, reader: ObdReader, rates: Optional[Dict[str, float]] = None,
+                 clock: Callable[[], float] = time.monotonic,
+                 sleep: Callable[[float], None] = time.sleep) -> None:
+        self.reader = reader
+        self.clock = clock
+        self.sleep = sleep
+
+        rates = DEFAULT_RATES if rates is None else rates
+        start = self.clock()
+        self.channels: List[ChannelSchedule] = [
+            ChannelSchedule(name, rate, start)
+            for name, rate in rates.items()
+            if rate > 0 and name in reader.supported_channels
+        ]
+        # One frame is the period of the fastest channel, the bus time packed per poll
+        self.frame = min((c.period for c in self.channels), default=1.0)
+
+        self.window_start = start
+        self.busy_time = 0.0
+
+    def _estimate_cost(self, channel: str, queued: set) -> float:
+        # PIDs already in the batch are shared through read_snapshot and cost nothing extra
+        return sum(
+            self.reader.latencies.get(command, DEFAULT_LATENCY)
+            for command in self.reader.channel_commands(channel)
+            if command not in queued
+        )
+
+    def poll(self) -> Dict[str, Any]:
+        # Wait for the earliest deadline, then read the due channels earliest
+        # deadline first, packing as many as the measured PID latencies fit in one frame
+        if not self.channels:
+            self.sleep(self.frame)
+            return {}
+
+        now = self.clock()
+        earliest = min(c.next_due for c in self.channels)
+        if earliest > now:
+            self.sleep(earliest - now)
+            now = self.clock()
+
+        due = sorted((c for c in self.channels if c.next_due <= now), key=lambda c: c.next_due)
+        batch: List[ChannelSchedule] = []
+        queued: set = set()
+        budget = self.frame
+        for channel in due:
+            cost = self._estimate_cost(channel.name, queued)
+            if batch and cost > budget:
+                continue
+            batch.append(channel)
+            queued.update(self.reader.channel_commands(channel.name))
+            budget -= cost
+
+        snapshot = self.reader.read_snapshot([c.name for c in batch])
+        done = self.clock()
+        self.busy_time += done - now
+
+        for channel in batch:
+            channel.reads += 1
+            channel.next_due += channel.period
+            # Do not burst to catch up on missed slots when the bus is saturated
+            if channel.next_due < done:
+                channel.next_due = done
+
+        return snapshot
+
+    def get_rate_report(self) -> Dict[str, Dict[str, float]]:
+        elapsed = self.clock() - self.window_start
+        report: Dict[str, Dict[str, float]] = {}
+        for channel in self.channels:
+            report[channel.name] = {
+                'target': channel.rate,
+                'achieved': channel.reads / elapsed if elapsed > 0 else 0.0,
+            }
+        return report
+
+    def get_bus_utilisation(self) -> float:
+        elapsed = self.clock() - self.window_start
+        return self.busy_time / elapsed if elapsed > 0 else 0.0
+
+    def log_rate_report(self) -> None:
+        report = self.get_rate_report()
+        elapsed = self.clock() - self.window_start
+        behind = [
+            f"{name} {rates['achieved']:.2f}/{rates['target']:.2f} Hz"
+            for name, rates in report.items()
+            # Slow channels may legitimately have no read yet in a short window
+            if rates['target'] * elapsed >= 1 and rates['achieved'] < rates['target'] * SATURATION_THRESHOLD
+        ]
+        utilisation = self.get_bus_utilisation()
+        if behind:
+            logging.warning(f"OBD bus saturated ({utilisation:.0%} busy), channels behind target: {', '.join(behind)}")
+        else:
+            logging.info(f"OBD bus {utilisation:.0%} busy, all channels at target rate.")
+
+    def reset_rate_report(self) -> None:
+        self.window_start = self.clock()
+        self.busy_time = 0.0
+        for channel in self.channels:
+            channel.reads = 0
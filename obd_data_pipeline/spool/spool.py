@@ -0,0 +1,101 @@
+import sqlite3
+import logging
+import threading
+import msgpack
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Dict, Any, Iterator, List, Tuple
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+Window = Tuple[datetime, Dict[str, Any]]
+
+
+class Spool:
+    # Append-only local store every window goes to before Postgres. SQLite in
+    # WAL mode with synchronous=FULL, so an appended window survives power loss.
+    # Delivery is at-least-once: a crash between the Postgres commit and
+    # commit() below replays the last batch, which the writer stores once.
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self.lock = threading.Lock()
+        self.appended = threading.Event()
+
+        self.connection = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self.connection.execute("PRAGMA journal_mode=WAL;")
+        self.connection.execute("PRAGMA synchronous=FULL;")
+        self.connection.execute("""
+            CREATE TABLE IF NOT EXISTS windows (
+                offset INTEGER PRIMARY KEY AUTOINCREMENT,
+                timestamp REAL NOT NULL,
+                payload BLOB NOT NULL
+            );
+        """)
+        self.connection.execute("""
+            CREATE TABLE IF NOT EXISTS committed (
+                id INTEGER PRIMARY KEY CHECK (id = 0),
+                offset INTEGER NOT NULL
+            );
+        """)
+        self.connection.execute("INSERT OR IGNORE INTO committed (id, offset) VALUES (0, 0);")
+
+        pending = self.pending()
+        if pending:
+            logging.info(f"Spool {path} has {pending} windows waiting to be forwarded.")
+
+    def append(self, windows: List[Window]) -> None:
+        # Packed before the transaction, so a window that cannot be packed leaves none open
+        rows = [(timestamp.timestamp(), msgpack.packb(data, use_bin_type=True)) for timestamp, data in windows]
+        with self.lock, self._transaction():
+            self.connection.executemany("INSERT INTO windows (timestamp, payload) VALUES (?, ?);", rows)
+        self.appended.set()
+
+    @contextmanager
+    def _transaction(self) -> Iterator[None]:
+        # Rolled back on any error, a transaction left open would make every later BEGIN fail
+        self.connection.execute("BEGIN;")
+        try:
+            yield
+        except BaseException:
+            self.connection.execute("ROLLBACK;")
+            raise
+        self.connection.execute("COMMIT;")
+
+    def committed_offset(self) -> int:
+        with self.lock:
+            return self.connection.execute("SELECT offset FROM committed WHERE id = 0;").fetchone()[0]
+
+    def pending(self) -> int:
+        with self.lock:
+            return self.connection.execute("""
+                SELECT count(*) FROM windows WHERE offset > (SELECT offset FROM committed WHERE id = 0);
+            """).fetchone()[0]
+
+    def read_batch(self, limit: int) -> List[Tuple[int, Window]]:
+        # Oldest uncommitted windows with their offsets
+        with self.lock:
+            rows = self.connection.execute("""
+                SELECT offset, timestamp, payload FROM windows
+                WHERE offset > (SELECT offset FROM committed WHERE id = 0)
+                ORDER BY offset LIMIT ?;
+            """, (limit,)).fetchall()
+        return [
+            (offset, (datetime.fromtimestamp(timestamp), msgpack.unpackb(payload, raw=False)))
+            for offset, timestamp, payload in rows
+        ]
+
+    def commit(self, offset: int) -> None:
+        # Everything up to offset is in Postgres, move the offset and drop the rows
+        with self.lock, self._transaction():
+            self.connection.execute("UPDATE committed SET offset = ? WHERE id = 0;", (offset,))
+            self.connection.execute("DELETE FROM windows WHERE offset <= ?;", (offset,))
+
+    def wait(self, timeout: float) -> bool:
+        # Blocks until something is appended or the timeout passes
+        appended = self.appended.wait(timeout)
+        self.appended.clear()
+        return appended
+
+    def close(self) -> None:
+        with self.lock:
+            self.connection.close()
@@ -0,0 +1,26 @@
+import numpy as np
+import pytest
+from buffer.history import ChannelHistory
+
+@pytest.fixture
+def history():
+    history = ChannelHistory(capacity=4)
+    for timestamp, value in enumerate([3.0, 1.0, 4.0, 1.0, 5.0]):
+        history.append(float(timestamp), value)
+    return history
+
+def test_rolling_min_and_max_over_wrapped_ring(history):
+    # The first sample was overwritten, the ring holds 1, 4, 1, 5
+    assert np.array_equal(history.rolling_min(2), [1.0, 1.0, 1.0])
+    assert np.array_equal(history.rolling_max(2), [4.0, 4.0, 5.0])
+
+def test_rolling_window_larger_than_history_is_empty(history):
+    assert history.rolling_min(5).size == 0
+    assert history.rolling_max(5).size == 0
+
+@pytest.mark.parametrize('size', [0, -1])
+def test_rolling_window_size_must_be_positive(history, size):
+    with pytest.raises(ValueError, match="at least 1"):
+        history.rolling_min(size)
+    with pytest.raises(ValueError, match="at least 1"):
+        history.rolling_max(size)
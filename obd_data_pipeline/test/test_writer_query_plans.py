@@ -0,0 +1,49 @@
+import psycopg2
+import pytest
+from data_writer.database_writer import DatabaseWriter
+from data_writer.database_writer import METRIC_TABLES
+
+# Query-plan regression test for DatabaseWriter's prepared statements, against
+# the car_data database with database/migrations applied: every upsert must be
+# decided by a unique index, never by scanning a table that grows with each
+# window. Skipped when Postgres is not available.
+
+SAMPLE_TIME = '2100-01-01 00:00:00'
+
+@pytest.fixture
+def writer():
+    writer = DatabaseWriter('car_data', 'mitchellbreust', userid=1, max_retries=1)
+    try:
+        writer.connect()
+    except psycopg2.OperationalError as e:
+        pytest.skip(f"Postgres is not available: {e}")
+    yield writer
+    writer.connection.rollback()
+    writer.close()
+
+def plan_nodes(plan):
+    yield plan
+    for child in plan.get('Plans', []):
+        yield from plan_nodes(child)
+
+def explain(writer, statement, params):
+    # EXPLAIN without ANALYZE, nothing is written
+    with writer.connection.cursor() as cursor:
+        cursor.execute(f"EXPLAIN (FORMAT JSON) {statement}", params)
+        return list(plan_nodes(cursor.fetchone()[0][0]['Plan']))
+
+def test_timestamp_upsert_uses_unique_index(writer):
+    nodes = explain(writer, "EXECUTE upsert_timestamp (%s);", (SAMPLE_TIME,))
+
+    assert nodes[0]['Conflict Arbiter Indexes'] == ['timestamps_timestamp_key']
+    assert not [node for node in nodes if node['Node Type'] in ('Seq Scan', 'Sort')]
+
+@pytest.mark.parametrize('key', METRIC_TABLES)
+def test_metric_inserts_use_unique_index(writer, key):
+    value = 'P0300' if key == 'diagnostic_codes' else 1.0
+    nodes = explain(writer, f"EXECUTE insert_{key} (%s, %s, %s);", (1, value, 1))
+
+    table = METRIC_TABLES[key][0].lower()
+    suffix = 'user_timestamp_code_idx' if key == 'diagnostic_codes' else 'user_timestamp_idx'
+    assert nodes[0]['Conflict Arbiter Indexes'] == [f"{table}_{suffix}"]
+    assert not [node for node in nodes if node['Node Type'] in ('Seq Scan', 'Sort')]